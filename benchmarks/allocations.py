@@ -0,0 +1,117 @@
+"""
+Memory allocated by the entity collision core (Entity.apply_momentum) per tick, in steady state movement.
+
+    python -m benchmarks.allocations [--ticks 300] [--output results.json] [--baseline old.json]
+
+Every scenario starts from the micro benchmarks' fixture, warms up, then traces each tick with tracemalloc:
+"garbage_bytes" is the most memory the tick had allocated at once on top of what was there before (what it throws
+away), "kept_blocks" how many memory blocks it kept (a leak if it keeps growing).
+CPython's own ints and floats still count, so a tick never gets to exactly 0 bytes.
+"""
+import argparse
+from array import array
+import gc
+import json
+import sys
+import tracemalloc
+
+from benchmarks.common import environment, write_results, pygame
+from benchmarks.micro import make_fixture
+from benchmarks.scenarios import wall_start
+from scripts.game import Game
+
+WARMUP_TICKS = 60
+DEFAULT_TICKS = 300
+
+
+def stand_velocity(player, tick):
+    return 0, 0
+
+
+def run_velocity(player, tick):
+    """Back and forth on the ground"""
+    return (player.SPEED if (tick // 50) % 2 == 0 else -player.SPEED), 0
+
+
+def wall_velocity(player, tick):
+    """Pushing against a wall"""
+    return player.SPEED, 0
+
+
+def fall_velocity(player, tick):
+    """Landing again and again: a short hop every 20 ticks"""
+    return 0, (-3 if tick % 20 == 0 else player.velocity[1] + player.GRAVITY_ACCELERATION)
+
+
+# name: (velocity(player, tick) -> (vx, vy), start(game) -> pos or None)
+SCENARIOS = {
+    "stand": (stand_velocity, None),
+    "run": (run_velocity, None),
+    "wall": (wall_velocity, wall_start),
+    "fall": (fall_velocity, None),
+}
+
+
+def run_scenario(game, velocity, find_start, ticks):
+    make_fixture(game)
+    player = game.player
+    start = find_start(game) if find_start else None
+    if start is not None:
+        player.pos = list(start)
+        game.step({}, WARMUP_TICKS)
+
+    def tick(index):
+        game.ticks += 1
+        player.velocity[0], player.velocity[1] = velocity(player, index)
+        player.apply_momentum(1)
+
+    for index in range(WARMUP_TICKS):
+        tick(index)
+
+    garbage = array("q", [0]) * ticks  # Filled in place, so the results don't count as kept blocks
+    gc.disable()
+    tracemalloc.start()
+    try:
+        start_blocks = sys.getallocatedblocks()
+        for index in range(ticks):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            tick(index)
+            garbage[index] = tracemalloc.get_traced_memory()[1] - before
+        kept_blocks = sys.getallocatedblocks() - start_blocks
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return {"ticks": ticks, "garbage_bytes": {"mean": round(sum(garbage) / len(garbage), 1), "max": max(garbage)},
+            "kept_blocks": kept_blocks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=DEFAULT_TICKS, help="traced ticks per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--output", help="JSON file (printed if not given)")
+    parser.add_argument("--baseline", help="previous JSON results to compare the mean garbage with")
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    game.screen = pygame.display.set_mode((Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT))
+    game.game_initialized = True
+
+    results = {"environment": environment(), "scenarios": {}}
+    for name in args.scenario or SCENARIOS:
+        velocity, find_start = SCENARIOS[name]
+        results["scenarios"][name] = run_scenario(game, velocity, find_start, args.ticks)
+    write_results(results, args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+        for name, stats in results["scenarios"].items():
+            if name in baseline:
+                old, new = baseline[name]["garbage_bytes"]["mean"], stats["garbage_bytes"]["mean"]
+                print(f"{name:20} {old:10.1f} -> {new:10.1f} bytes/tick")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import os
+import platform
+import sys
+import time
+
+# Benchmarks never open a window. Has to be set before pygame initialises video
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+
+def percentiles(samples, points=(50, 90, 95, 99)):
+    """Nearest-rank percentiles (plus mean and max) of a list of durations in seconds, reported in ms"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    stats = {"mean": sum(ordered) / len(ordered) * 1000, "max": ordered[-1] * 1000}
+    for point in points:
+        rank = max(0, min(len(ordered) - 1, round(point / 100 * len(ordered)) - 1))
+        stats[f"p{point}"] = ordered[rank] * 1000
+    return {name: round(value, 6) for name, value in stats.items()}
+
+
+def environment():
+    return {
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(str(v) for v in pygame.get_sdl_version()),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def write_results(results, path=None):
+    text = json.dumps(results, indent=1)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def compare_results(old, new, key="p50", path=()):
+    """Prints key (a percentile name) of every measure found in both result trees, old -> new"""
+    if isinstance(new, dict) and key in new and isinstance(old, dict) and key in old:
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0
+        print(f"{'/'.join(path):60} {old[key]:10.4f} -> {new[key]:10.4f} ms  {change:+6.1f}%")
+        return
+    if isinstance(new, dict) and isinstance(old, dict):
+        for name in new:
+            if name in old:
+                compare_results(old[name], new[name], key, path + (name,))
@@ -0,0 +1,226 @@
+"""
+Microbenchmarks of the hot paths, each on its own over a fixed fixture.
+
+    python -m benchmarks.micro [--only NAME] [--output results.json] [--baseline old.json] [--threshold 0.25]
+
+The fixture is always map 001 with the player standing at FIXTURE_POS and a seeded RNG, rebuilt before every
+benchmark so one can't warm up (or dirty) the caches of the next.
+With --baseline, a benchmark whose p50 got slower than its threshold (relative to the baseline p50) is reported
+as a regression and the exit code is 1.
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+
+from benchmarks.common import percentiles, environment, write_results, compare_results, pygame
+from scripts.entity_world import EntityWorld
+from scripts.game import Game
+from scripts.physics import Entity
+from scripts.tile_chunks import CHUNK_SIZE
+
+FIXTURE_LEVEL = 1
+FIXTURE_POS = (100, 0)
+FIXTURE_SETTLE_TICKS = 60  # Lets the player fall on the ground first
+SEED = 1234
+DEFAULT_THRESHOLD = 0.25
+MIN_SAMPLE_TIME = 0.002  # seconds
+
+
+def make_fixture(game):
+    game.start_headless(FIXTURE_LEVEL)
+    game.seed_rng(SEED)
+    game.player.pos = list(FIXTURE_POS)
+    game.player.velocity = [0, 0]
+    game.player.rotation_angle = 0
+    game.step({}, FIXTURE_SETTLE_TICKS)
+    game.prev_scroll = list(game.scroll)
+    game.player.prev_pos = list(game.player.pos)
+    game.render_alpha = 1
+
+
+def bench_tilemap_render(game, cold):
+    tilemap = game.tilemap
+    scroll = tuple(int(v) for v in game.scroll)
+
+    def run():
+        if cold:
+            tilemap.chunk_cache.clear()
+        for layer in tilemap.tilemap:
+            tilemap.render(game.display, layer, offset=scroll)
+    return run
+
+
+def bench_physics_rects_around(game):
+    tilemap, player = game.tilemap, game.player
+    hitbox = player.rect
+    return lambda: tilemap.physics_rects_around(hitbox, player.GRAVITY_DIRECTION)
+
+
+def bench_autotile(game):
+    tilemap = game.tilemap
+    layer = max(tilemap.tilemap, key=lambda name: len(tilemap.tilemap[name]))
+    # autotile is an editor tool, it reads the variant counts from the editor's tile assets
+    for tile in tilemap.tile_manager.tiles.values():
+        game.assets.setdefault(tile.type, tile.images)
+    return lambda: tilemap.autotile(layer)
+
+
+def bench_collision_check(game, axe):
+    player = game.player
+    pos, velocity = list(player.pos), list(player.velocity)
+    # Moving into the ground for "y", running along it for "x"
+    push = [2, 0] if axe == "x" else [0, 2]
+
+    def run():
+        player.pos[:] = pos
+        player.velocity[:] = velocity
+        player.pos[0] += push[0]
+        player.pos[1] += push[1]
+        player.velocity[0], player.velocity[1] = push
+        player.collision_check(axe, 1)
+    return run
+
+
+def bench_collide_with(game, angle):
+    player = game.player
+    player.rotation_angle = angle
+    target = player.rect.move(player.size[0] // 2, 0)
+    target.size = (game.tile_size, game.tile_size)
+    return lambda: player.collide_with(target)
+
+
+def bench_create_light_mask(game, light_type):
+    shader = game.shader
+    props = dict(game.light_properties[light_type], flicker=False)
+    return lambda: shader.create_light_mask(props["radius"], props["color"], props["intensity"],
+                                            props["edge_softness"], props["flicker"])
+
+
+def bench_apply_lighting(game, resolution=1, lights=0):
+    """resolution: game.lighting_resolution. lights: flickering torches spread over the screen"""
+    shader = game.shader
+    scroll = tuple(game.scroll)
+    game.lighting_resolution = resolution
+    rng = random.Random(SEED)
+    width, height = game.display.get_size()
+    for _ in range(lights):
+        shader.register_light_emitting_tile([scroll[0] + rng.uniform(0, width), scroll[1] + rng.uniform(0, height)])
+    shader.bake_static_lights()
+    return lambda: shader.apply_lighting(scroll)
+
+
+def bench_entity_world_step(game, count):
+    """count bodies dropped over the level, running left or right"""
+    world = EntityWorld(game)
+    rng = random.Random(SEED)
+    x_max = (max(chunk_x for chunk_x, _ in game.tilemap.collision_grid.chunks) + 1) * CHUNK_SIZE * game.tile_size
+    for _ in range(count):
+        body = world.add(Entity(game, game.tilemap, (rng.uniform(0, x_max), rng.uniform(-64, 64)), (12, 12)))
+        body.velocity[0] = rng.choice((-1, 1)) * rng.uniform(0.5, 2)
+    for _ in range(30):  # Everyone on the ground
+        world.step(1)
+
+    def run():
+        game.ticks += 1
+        world.step(1)
+    return run
+
+
+# name: (setup(game) -> callable, samples, threshold)
+BENCHMARKS = {
+    "tilemap.render.warm": (lambda game: bench_tilemap_render(game, cold=False), 100, DEFAULT_THRESHOLD),
+    "tilemap.render.cold": (lambda game: bench_tilemap_render(game, cold=True), 30, DEFAULT_THRESHOLD),
+    "tilemap.physics_rects_around": (bench_physics_rects_around, 100, DEFAULT_THRESHOLD),
+    "tilemap.autotile": (bench_autotile, 5, DEFAULT_THRESHOLD),
+    "entity.collision_check.x": (lambda game: bench_collision_check(game, "x"), 100, DEFAULT_THRESHOLD),
+    "entity.collision_check.y": (lambda game: bench_collision_check(game, "y"), 100, DEFAULT_THRESHOLD),
+    "player.collide_with.unrotated": (lambda game: bench_collide_with(game, 0), 100, DEFAULT_THRESHOLD),
+    "player.collide_with.rotated": (lambda game: bench_collide_with(game, 30), 100, DEFAULT_THRESHOLD),
+    "shader.create_light_mask.player": (lambda game: bench_create_light_mask(game, "player"), 100, DEFAULT_THRESHOLD),
+    "shader.create_light_mask.torch": (lambda game: bench_create_light_mask(game, "torch"), 100, DEFAULT_THRESHOLD),
+    "shader.apply_lighting": (bench_apply_lighting, 100, DEFAULT_THRESHOLD),
+    "shader.apply_lighting.40_lights.full": (lambda game: bench_apply_lighting(game, 1, 40), 100, DEFAULT_THRESHOLD),
+    "shader.apply_lighting.40_lights.half": (lambda game: bench_apply_lighting(game, 2, 40), 100, DEFAULT_THRESHOLD),
+    "shader.apply_lighting.40_lights.quarter": (lambda game: bench_apply_lighting(game, 4, 40), 100,
+                                                DEFAULT_THRESHOLD),
+    "entity_world.step.200": (lambda game: bench_entity_world_step(game, 200), 30, DEFAULT_THRESHOLD),
+}
+
+
+def calls_per_sample(function, min_time=MIN_SAMPLE_TIME):
+    """Like timeit's autorange: enough calls per sample that the timer resolution and noise don't dominate"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def run_benchmark(game, setup, sample_count):
+    make_fixture(game)
+    function = setup(game)
+    number = calls_per_sample(function)
+    samples = []
+    gc.disable()  # Like timeit, a collection landing in one benchmark says nothing about it
+    try:
+        for _ in range(sample_count):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+    return dict(percentiles(samples), calls_per_sample=number)
+
+
+def check_regressions(baseline, results):
+    """Names of the benchmarks whose p50 went over baseline p50 * (1 + threshold)"""
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline or name not in BENCHMARKS:
+            continue
+        limit = baseline[name]["p50"] * (1 + BENCHMARKS[name][2])
+        if stats["p50"] > limit:
+            regressions.append(name)
+            print(f"REGRESSION {name}: p50 {stats['p50']:.4f} ms > {limit:.4f} ms", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="default: all")
+    parser.add_argument("--output", help="JSON file (printed if not given)")
+    parser.add_argument("--baseline", help="previous JSON results to compare with and check the thresholds against")
+    parser.add_argument("--threshold", type=float, help="overrides every benchmark's threshold (0.25 = 25%% slower)")
+    args = parser.parse_args()
+
+    if args.threshold is not None:
+        for name, (setup, sample_count, _) in BENCHMARKS.items():
+            BENCHMARKS[name] = (setup, sample_count, args.threshold)
+
+    game = Game(headless=True)
+    game.screen = pygame.display.set_mode((Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT))
+    game.game_initialized = True
+
+    results = {"environment": environment(), "seed": SEED, "benchmarks": {}}
+    for name in args.only or BENCHMARKS:
+        setup, sample_count, _ = BENCHMARKS[name]
+        results["benchmarks"][name] = run_benchmark(game, setup, sample_count)
+    write_results(results, args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["benchmarks"]
+        compare_results(baseline, results["benchmarks"])
+        if check_regressions(baseline, results["benchmarks"]):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+End-to-end frame benchmarks over the shipped levels.
+
+    python -m benchmarks.scenarios [--ticks 600] [--output results.json] [--compare old.json]
+
+Every scenario loads a map, drives the player with a scripted input path and times each frame phase
+(_update_world, _render_world, Shader.apply_lighting inside it, _render_ui). The RNG is seeded so two
+runs do the same work.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import percentiles, environment, write_results, compare_results, pygame
+from scripts.game import Game
+from scripts.tile_chunks import COLLISION_SOLID
+
+LEVELS = (1, 2)
+LEVEL_SPAWNS = {1: (100, 0), 2: (8 * 16, 5 * 16)}  # Where a new game / the level transition puts the player
+SEED = 1234
+PHASES = ("update_world", "render_world", "apply_lighting", "render_ui")
+
+
+def run_inputs(tick):
+    """Runs right, jumping now and then, turning back every few seconds"""
+    back = (tick // 150) % 3 == 2
+    return {"key_right": int(not back), "key_left": int(back), "key_jump": int(tick % 45 < 8)}
+
+
+def dash_chain_inputs(tick):
+    """Dashes as soon as the cooldown allows, alternating straight and diagonal up dashes"""
+    back = (tick // 120) % 2 == 1
+    return {"key_right": int(not back), "key_left": int(back), "key_dash": int(tick % 20 == 0),
+            "key_up": int(tick % 40 < 20), "key_jump": int(tick % 40 == 10)}
+
+
+def wall_jump_inputs(tick):
+    """Holds towards the wall and keeps jumping off it"""
+    return {"key_right": 1, "key_jump": int(tick % 24 < 10)}
+
+
+def spike_inputs(tick):
+    """Short back and forth runs over the spikes"""
+    back = (tick // 40) % 2 == 1
+    return {"key_right": int(not back), "key_left": int(back), "key_jump": int(tick % 30 < 6)}
+
+
+def spike_start(game):
+    """Above the spike with the most spikes around it"""
+    spikes = [spike.pos for spike in getattr(game, "spikes", [])]
+    if not spikes:
+        return None
+    densest = max(spikes, key=lambda pos: sum(abs(pos[0] - other[0]) <= 64 and abs(pos[1] - other[1]) <= 64
+                                              for other in spikes))
+    return densest[0], densest[1] - 3 * game.tile_size
+
+
+def wall_start(game):
+    """Left of the tallest wall (a column of solid tiles with free space on its left)"""
+    grid = game.tilemap.collision_grid
+    best = None
+    for chunk_pos in sorted(grid.chunks):
+        for index, code in enumerate(grid.chunks[chunk_pos]):
+            if not code & COLLISION_SOLID:
+                continue
+            x, y = (chunk_pos[0] << 5) + (index & 31), (chunk_pos[1] << 5) + (index >> 5)
+            if grid.get(x, y - 1) & COLLISION_SOLID or grid.get(x - 1, y):
+                continue  # Only the top of a wall with free space on its left
+            height = 0
+            while grid.get(x, y + height) & COLLISION_SOLID and not grid.get(x - 1, y + height) and height < 16:
+                height += 1
+            if best is None or height > best[0]:
+                best = (height, x, y)
+    if best is None or best[0] < 4:
+        return None
+    height, x, y = best
+    return (x - 1) * game.tile_size, (y + height - 2) * game.tile_size
+
+
+SCENARIOS = {
+    "run": (run_inputs, None),
+    "dash_chain": (dash_chain_inputs, None),
+    "wall_jump": (wall_jump_inputs, wall_start),
+    "spikes": (spike_inputs, spike_start),
+}
+
+
+def timed(samples, name, function):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        samples[name].append(time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+def make_game():
+    game = Game(headless=True)
+    # Real screen size so _render_ui scales the same amount of pixels as the game
+    game.screen = pygame.display.set_mode((Game.SCREEN_WIDTH, Game.SCREEN_HEIGHT))
+    game.game_initialized = True  # No first-frame save
+    return game
+
+
+def run_scenario(game, level_id, inputs, find_start, ticks):
+    game.start_headless(level_id)
+    game.seed_rng(SEED)
+    start = find_start(game) if find_start else None
+    start = list(start or LEVEL_SPAWNS[level_id])
+    game.player.pos = list(start)
+    game.player.velocity = [0, 0]
+    game.spawn_point = {"pos": list(start), "level": game.level}
+
+    samples = {name: [] for name in PHASES + ("frame",)}
+    update_world, render_world, render_ui = game._update_world, game._render_world, game._render_ui
+    game.shader.apply_lighting = timed(samples, "apply_lighting", game.shader.apply_lighting)
+    try:
+        for tick in range(ticks):
+            game.dict_kb.update({"key_right": 0, "key_left": 0, "key_up": 0, "key_down": 0, "key_jump": 0,
+                                 "key_dash": 0})
+            game.dict_kb.update(inputs(tick))
+            frame_start = time.perf_counter()
+            timed(samples, "update_world", update_world)(1)
+            if game.player_dead:
+                game._headless_respawn()  # Not the death screen, it sleeps
+            timed(samples, "render_world", render_world)()
+            timed(samples, "render_ui", render_ui)()
+            samples["frame"].append(time.perf_counter() - frame_start)
+    finally:
+        del game.shader.apply_lighting
+
+    return {"start": start, "ticks": ticks, "deaths": game.death_counter,
+            "phases": {name: percentiles(values) for name, values in samples.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=600, help="frames per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="default: all")
+    parser.add_argument("--level", type=int, action="append", choices=LEVELS, help="default: all")
+    parser.add_argument("--output", help="JSON file (printed if not given)")
+    parser.add_argument("--compare", help="previous JSON results to compare the p50s with")
+    args = parser.parse_args()
+
+    game = make_game()
+    results = {"environment": environment(), "seed": SEED, "scenarios": {}}
+    for level_id in args.level or LEVELS:
+        for name in args.scenario or SCENARIOS:
+            inputs, find_start = SCENARIOS[name]
+            game.death_counter = 0
+            results["scenarios"][f"{level_id:03d}/{name}"] = run_scenario(game, level_id, inputs, find_start,
+                                                                          args.ticks)
+    write_results(results, args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f)["scenarios"], results["scenarios"])
+
+
+if __name__ == "__main__":
+    main()
@@ -805,14 +805,18 @@ class PlayTest(Game):
         The main program entry point.
         This function implements a state machine to switch between the Intro, Profile Menu, and Gameplay.
         """
-        match self.state:
+        state = self.state
+        match state:
             case self.MENU_STATE:
                 self.menu.draw()
                 if self.menu.menu_state == self.menu.TITLE_STATE:
                     self.leave()
             case self.PLAYING_STATE:
+                if self.drawn_state != self.PLAYING_STATE:
+                    self.resume_clock()
                 self.main_game_logic()
                 self.menu.draw_player_souls()
+        self.drawn_state = state
         self.apply_brightness()
         pygame.display.update()
 
@@ -1462,17 +1466,11 @@ class EditorSimulation:
             for old_loc, loc in self.moved_link[grid].items():
                 x, y = (float(val) for val in loc.split(";"))
                 if old_loc in self.tilemap.tilemap[self.current_layer]:
-                    tile_id, variant, rot, flip_h, flip_v = self.tilemap.tile_manager.unpack_tile(
-                        self.tilemap.tilemap[self.current_layer][old_loc]
-                    )
+                    packed = self.tilemap.tilemap[self.current_layer][old_loc]
                 else:
-                    tile_id, variant, rot, flip_h, flip_v = self.tilemap.tile_manager.unpack_tile(
-                        self.tilemap.offgrid_tiles[self.current_layer][old_loc]
-                    )
+                    packed = self.tilemap.offgrid_tiles[self.current_layer][old_loc]
 
-                tile_img = self.tilemap.tile_manager.get_tile_img(tile_id, variant)
-                tile_img = pygame.transform.rotate(tile_img, rot * -90)
-                tile_img = pygame.transform.flip(tile_img, flip_h, flip_v)
+                tile_img = self.tilemap.tile_manager.get_transformed_img(packed)
                 if grid == "ongrid":
                     draw_pos = (x * self.tilemap.tile_size - self.scroll[0], y * self.tilemap.tile_size - self.scroll[1])
                 else:
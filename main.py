@@ -1,6 +1,15 @@
+import argparse
+
 from scripts.game import Game
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Anima")
+    parser.add_argument("--record", metavar="PATH",
+                        help="F9 in game restarts the level and records the inputs to PATH, F9 again saves "
+                             "(replay it with python -m scripts.replay PATH)")
+    args = parser.parse_args()
+
     # Instantiate the game and start the loop
     game = Game()
-    game.run()
\ No newline at end of file
+    game.replay_path = args.record
+    game.run()
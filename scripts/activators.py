@@ -1,7 +1,5 @@
 import pygame
-import time
 import json
-import random
 from scripts.particle import Particle
 
 class Activator:
@@ -17,7 +15,7 @@ class Activator:
         self.activated = "progressive_teleporter" not in self.type
 
     def toggle(self):#Basically change the state of the lever from activated to not activated. Takes into account the countdown(useful for silly people trying to destroy the game)
-        current_time = time.time()
+        current_time = self.game.sim_time
         if current_time - self.last_interaction_time >= self.interaction_cooldown:
             self.state = int(not self.state)
             self.last_interaction_time = current_time
@@ -48,14 +46,14 @@ def load_activators_actions(map_name, activators_layers):
 def update_teleporter(game, t_id):
     if t_id is not None:
         action = game.activators_actions[str(game.level)]["teleporters"][str(t_id)]
-        if time.time() - game.last_teleport_time < action["time"] - 0.2:
-            pos = (game.player.rect().x + random.random() * game.player.rect().width,
-                   game.player.rect().y + 5 + random.random() * game.player.rect().height)
+        if game.sim_time - game.last_teleport_time < action["time"] - 0.2:
+            pos = (game.player.rect().x + game.rng.random() * game.player.rect().width,
+                   game.player.rect().y + 5 + game.rng.random() * game.player.rect().height)
             game.particles.append(
                 Particle(game, 'crystal_fragment', pos, velocity=[-0.1, -4], frame=0))
             pass
         else:
-            game.last_teleport_time = time.time()
+            game.last_teleport_time = game.sim_time
             game.player.pos = action["dest"].copy()
             game.teleporting = False
             game.tp_id = None
@@ -88,7 +86,7 @@ def update_activators_actions(game):
                         break
 
             if action["infos_type"] in ("normal_tp", "progressive_tp"):
-                game.last_teleport_time = time.time()
+                game.last_teleport_time = game.sim_time
                 game.teleporting = True
                 game.tp_id = str(activator.id)
 
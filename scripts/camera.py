@@ -1,6 +1,5 @@
 
 import pygame
-import time
 
 class Camera:
 
@@ -11,10 +10,10 @@ class Camera:
         self.game.moving_visual = True
         self.game.visual_pos = pos
         self.game.visual_movement_duration = duration
-        self.game.visual_start_time = time.time()
+        self.game.visual_start_time = self.game.sim_time
 
     def update_camera(self):
-        current_time = time.time()
+        current_time = self.game.sim_time
 
         if self.game.moving_visual:
             elapsed_time = current_time - self.game.visual_start_time
@@ -0,0 +1,98 @@
+"""
+Colliders that aren't in the collision grid (doors, sinking groups, anything moving) indexed in spatial buckets, so a
+collision query only looks at the ones around it instead of every one in the level.
+A collider is any object with a bbox Rect (its bounding box, kept up to date by its owner, who calls move after
+changing it) and a rects_in(area) method giving its rects overlapping area.
+"""
+
+BUCKET_SIZE = 64  # pixels
+
+
+class ColliderRegistry:
+    def __init__(self):
+        self.entries = {}  # collider -> (kind, bucket box)
+        self.buckets = {}  # (bucket x, bucket y) -> {collider: None}
+        self.order = {}  # collider -> rank of its first registration, queries answer in that order
+        self.version = 0  # Bumped whenever a collider comes, goes or moves, entity caches compare it
+
+    @staticmethod
+    def bucket_box(rect):
+        return (rect.left // BUCKET_SIZE, rect.top // BUCKET_SIZE,
+                (rect.right - 1) // BUCKET_SIZE, (rect.bottom - 1) // BUCKET_SIZE)
+
+    def add(self, collider, kind):
+        """kind: what the collider is ("door", "sinking"...), see near"""
+        if collider in self.entries:
+            return
+        self.order.setdefault(collider, len(self.order))
+        box = self.bucket_box(collider.bbox)
+        self.entries[collider] = (kind, box)
+        self._fill(collider, box)
+        self.version += 1
+
+    def remove(self, collider):
+        entry = self.entries.pop(collider, None)
+        if entry is not None:
+            self._empty(collider, entry[1])
+            self.version += 1
+
+    def move(self, collider):
+        """To call after changing the bbox of a registered collider"""
+        kind, box = self.entries[collider]
+        new_box = self.bucket_box(collider.bbox)
+        if new_box != box:
+            self._empty(collider, box)
+            self._fill(collider, new_box)
+            self.entries[collider] = (kind, new_box)
+        self.version += 1
+
+    def clear(self):
+        self.entries = {}
+        self.buckets = {}
+        self.order = {}
+        self.version += 1
+
+    def _fill(self, collider, box):
+        for bx in range(box[0], box[2] + 1):
+            for by in range(box[1], box[3] + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket is None:
+                    bucket = self.buckets[(bx, by)] = {}
+                bucket[collider] = None
+
+    def _empty(self, collider, box):
+        for bx in range(box[0], box[2] + 1):
+            for by in range(box[1], box[3] + 1):
+                bucket = self.buckets[(bx, by)]
+                del bucket[collider]
+                if not bucket:
+                    del self.buckets[(bx, by)]
+
+    def near(self, area, kind=None):
+        """Colliders (of kind if given) whose bbox overlaps area, in registration order"""
+        x_min, y_min, x_max, y_max = self.bucket_box(area)
+        found = {}
+        for bx in range(x_min, x_max + 1):
+            for by in range(y_min, y_max + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket:
+                    found.update(bucket)
+        if not found:
+            return []
+        entries = self.entries
+        colliders = [collider for collider in found
+                     if collider.bbox.colliderect(area) and (kind is None or entries[collider][0] == kind)]
+        if len(colliders) > 1:
+            colliders.sort(key=self.order.__getitem__)
+        return colliders
+
+    def rects_in(self, area, kind=None):
+        """Rects of the colliders (of kind if given) overlapping area"""
+        rects = []
+        for collider in self.near(area, kind):
+            rects += collider.rects_in(area)
+        return rects
+
+    def is_kind(self, rect, kind):
+        """Whether rect is (equal to) one of the rects of a collider of kind"""
+        return any(rect in collider.rects_in(rect) for collider in self.near(rect, kind))
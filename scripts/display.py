@@ -1,11 +1,34 @@
+import numpy as np
 import pygame
-import random
+
+from scripts.shadows import ShadowCaster
+from scripts.tile_chunks import CHUNK_SIZE
+
+LIGHT_BUCKET_SIZE = 256  # pixels
+
+FLICKER_VARIANTS = 8  # Precomputed flicker strengths per flickering light
+FLICKER_MIN, FLICKER_MAX = 0.85, 1.15
+
 
 class Shader:
 
     def __init__(self, game):
         self.game = game
         self.display = game.display
+        self.light_masks = {}  # (radius, color, intensity, edge_softness) -> gradient surface
+        self.flicker_masks = {}  # same key -> FLICKER_VARIANTS gradient surfaces
+        self.light_contributions = {}  # (gradient surface, scale) -> its colored lightmap sprite
+        self.lightmap = None
+        self.reduced_display = None  # The display at the lightmap size, lit there when lighting_resolution > 1
+        self.baked_chunks = None  # chunk pos -> static tile lights, see bake_static_lights
+        self.scaled_baked_chunks = {}
+        self.baked_shadows = False  # Baked lights cast shadows, the bake follows the collision grid
+        self.baked_stamp = 0
+        self.shadow_caster = ShadowCaster(game)
+        # light key -> {sprite: (visibility polygon, shadowed sprite)}. Keys: "player", ("tile", index) or the
+        # light-emitting object itself, its entries go with it (see forget_light)
+        self.shadowed_sprites = {}
+        self.light_buckets = {}  # bucket pos -> indexes in light_emitting_tiles of the flickering lights reaching it
 
     def generate_fog(self, surface, color=(220, 230, 240), opacity=40):
         fog_surface = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
@@ -13,9 +36,29 @@ class Shader:
         surface.blit(fog_surface, (0, 0))
 
     def create_light_mask(self, radius, color=(255, 255, 255), intensity=255, edge_softness=50, flicker=False):
+        """
+        Radial gradient of the light, from the cache. The surface is shared: blit it, never draw on it.
+        A flickering light picks one of its FLICKER_VARIANTS masks, all drawn the first time the light is seen.
+        """
+        key = (radius, tuple(color), intensity, edge_softness)
+        if flicker and self.game.render_rng.random() < 0.3:
+            variants = self.flicker_masks.get(key)
+            if variants is None:
+                step = (FLICKER_MAX - FLICKER_MIN) / FLICKER_VARIANTS
+                variants = self.flicker_masks[key] = tuple(
+                    self.draw_light_mask(radius, color, intensity, FLICKER_MIN + (i + 0.5) * step)
+                    for i in range(FLICKER_VARIANTS))
+            return variants[int(self.game.render_rng.random() * FLICKER_VARIANTS)]
+
+        light_mask = self.light_masks.get(key)
+        if light_mask is None:
+            light_mask = self.light_masks[key] = self.draw_light_mask(radius, color, intensity)
+        return light_mask
+
+    @staticmethod
+    def draw_light_mask(radius, color, intensity, flicker_factor=1):
         actual_radius = radius
-        if flicker and random.random() < 0.3:
-            flicker_factor = 0.85 + random.random() * 0.3
+        if flicker_factor != 1:
             actual_radius = int(radius * flicker_factor)
             intensity = int(intensity * flicker_factor)
 
@@ -33,102 +76,202 @@ class Shader:
             alpha = int(intensity * (distance_factor ** 0.8))  # Exponent < 1 creates a softer gradient
 
             # Apply color with calculated alpha
-            light_color = color + (alpha,)
+            light_color = tuple(color) + (alpha,)
             pygame.draw.circle(light_mask, light_color, center, r)
 
-        # Optional: Apply a small Gaussian blur if pygame has this capability
-        # This would require an external library like pygame.transform.smoothscale
-        # or implementing a custom blur function
-
         return light_mask
 
+    def light_contribution(self, light_mask, color, scale=1):
+        """
+        What a gradient adds to the lightmap: an RGB sprite of alpha * color, shrunk by scale for reduced resolution
+        lightmaps. Cached with the gradient.
+        """
+        key = (light_mask, scale)
+        contribution = self.light_contributions.get(key)
+        if contribution is None:
+            alpha = pygame.surfarray.array_alpha(light_mask).astype(np.uint16)
+            light = (alpha[:, :, None] * np.array(color, dtype=np.uint16) // 255).astype(np.uint8)
+            contribution = pygame.surfarray.make_surface(light)
+            if scale != 1:
+                width, height = contribution.get_size()
+                contribution = pygame.transform.smoothscale(contribution, (max(1, width // scale),
+                                                                           max(1, height // scale)))
+            self.light_contributions[key] = contribution
+        return contribution
+
+    def light_sprite(self, props, scale=1, light_key=None, world_pos=None):
+        """
+        (radius, lightmap sprite) of a light_properties entry. Lights with "shadows" get their sprite cut to what
+        they see from world_pos, light_key identifies the light in the shadow caches.
+        """
+        radius = props.get("radius", 80)
+        color = props.get("color", (255, 255, 255))
+        light_mask = self.create_light_mask(radius, color, props.get("intensity", 200),
+                                            props.get("edge_softness", 30), props.get("flicker", False))
+        sprite = self.light_contribution(light_mask, color, scale)
+        if props.get("shadows") and light_key is not None:
+            sprite = self.shadowed_sprite(sprite, light_key, world_pos, radius, scale)
+        return radius, sprite
+
+    def shadowed_sprite(self, sprite, light_key, world_pos, radius, scale=1):
+        """The light sprite multiplied by its visibility polygon, redrawn only when the polygon changes"""
+        polygon = self.shadow_caster.polygon(light_key, world_pos, radius)
+        sprites = self.shadowed_sprites.get(light_key)
+        if sprites is None:
+            sprites = self.shadowed_sprites[light_key] = {}
+        cached = sprites.get(sprite)
+        if cached is None or cached[0] is not polygon:
+            visible = pygame.Surface(sprite.get_size())
+            visible.fill((0, 0, 0))
+            if len(polygon) > 2:
+                left, top = world_pos[0] - radius, world_pos[1] - radius
+                pygame.draw.polygon(visible, (255, 255, 255),
+                                    [((x - left) / scale, (y - top) / scale) for x, y in polygon])
+            shadowed = sprite.copy()
+            shadowed.blit(visible, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+            cached = sprites[sprite] = (polygon, shadowed)
+        return cached[1]
+
+    def add_light(self, lightmap, props, world_pos, render_scroll, scale=1, light_key=None):
+        """Adds a light (light_properties entry) centered on world_pos to the lightmap"""
+        radius, sprite = self.light_sprite(props, scale, light_key, world_pos)
+        lightmap.blit(sprite, ((world_pos[0] - render_scroll[0] - radius) / scale,
+                               (world_pos[1] - render_scroll[1] - radius) / scale), special_flags=pygame.BLEND_RGB_ADD)
+
+    def bake_static_lights(self):
+        """
+        Draws every tile light that doesn't flicker into lightmap chunks (CHUNK_SIZE tiles square, in world pixels),
+        so apply_lighting adds the few chunks under the camera instead of every light.
+        Flickering tile lights change every frame, they stay dynamic and are indexed in LIGHT_BUCKET_SIZE buckets
+        instead, by the area they light.
+        """
+        self.baked_chunks = {}
+        self.scaled_baked_chunks = {}
+        self.light_buckets = {}
+        self.baked_shadows = False
+        self.baked_stamp = self.game.tilemap.collision_grid.stamp
+        chunk_pixels = CHUNK_SIZE * self.game.tile_size
+        for index, light_tile in enumerate(self.game.light_emitting_tiles):
+            properties = self.game.light_properties[light_tile.get("type", "torch")]
+            if properties["flicker"]:
+                self.index_light(index, light_tile["pos"], properties["radius"])
+                continue
+            self.baked_shadows = self.baked_shadows or properties.get("shadows", False)
+            radius, sprite = self.light_sprite(properties, light_key=("tile", index), world_pos=light_tile["pos"])
+            x, y = int(light_tile["pos"][0]) - radius, int(light_tile["pos"][1]) - radius
+            for cx in range(x // chunk_pixels, (x + 2 * radius) // chunk_pixels + 1):
+                for cy in range(y // chunk_pixels, (y + 2 * radius) // chunk_pixels + 1):
+                    chunk = self.baked_chunks.get((cx, cy))
+                    if chunk is None:
+                        chunk = self.baked_chunks[(cx, cy)] = pygame.Surface((chunk_pixels, chunk_pixels))
+                        chunk.fill((0, 0, 0))
+                    chunk.blit(sprite, (x - cx * chunk_pixels, y - cy * chunk_pixels),
+                               special_flags=pygame.BLEND_RGB_ADD)
+
+    def index_light(self, index, pos, radius):
+        x_min, y_min = int(pos[0] - radius) // LIGHT_BUCKET_SIZE, int(pos[1] - radius) // LIGHT_BUCKET_SIZE
+        x_max, y_max = int(pos[0] + radius) // LIGHT_BUCKET_SIZE, int(pos[1] + radius) // LIGHT_BUCKET_SIZE
+        for bx in range(x_min, x_max + 1):
+            for by in range(y_min, y_max + 1):
+                self.light_buckets.setdefault((bx, by), []).append(index)
+
+    def lights_in(self, x_min, y_min, x_max, y_max):
+        """(index, light) of the indexed (flickering) tile lights of the buckets overlapping the box, in order"""
+        found = set()
+        for bx in range(int(x_min) // LIGHT_BUCKET_SIZE, int(x_max) // LIGHT_BUCKET_SIZE + 1):
+            for by in range(int(y_min) // LIGHT_BUCKET_SIZE, int(y_max) // LIGHT_BUCKET_SIZE + 1):
+                found.update(self.light_buckets.get((bx, by), ()))
+        return [(index, self.game.light_emitting_tiles[index]) for index in sorted(found)]
+
+    def baked_chunk(self, chunk_pos, scale=1):
+        chunk = self.baked_chunks.get(chunk_pos)
+        if chunk is None or scale == 1:
+            return chunk
+        scaled = self.scaled_baked_chunks.get((chunk_pos, scale))
+        if scaled is None:
+            size = chunk.get_width() // scale
+            scaled = self.scaled_baked_chunks[(chunk_pos, scale)] = pygame.transform.smoothscale(chunk, (size, size))
+        return scaled
+
     def apply_lighting(self, render_scroll):
-        """Apply darkness effect with player and other light sources"""
-        # Create a surface for darkness
-        darkness = pygame.Surface(self.game.display.get_size(), pygame.SRCALPHA)
-        darkness.fill((0, 0, 0, self.game.darkness_level))  # Semi-transparent black
-
-        # Create and apply player light
-        player_props = self.game.player_light
-        player_light = self.create_light_mask(
-            player_props["radius"],
-            player_props["color"],
-            player_props["intensity"],
-            player_props["edge_softness"],
-            player_props["flicker"]
-        )
-
-        # Calculate player position on screen
-        player_screen_x = self.game.player.rect.centerx - render_scroll[0]
-        player_screen_y = self.game.player.rect.centery - render_scroll[1]
-
-        # Position for the light mask
-        light_x = player_screen_x - player_props["radius"]
-        light_y = player_screen_y - player_props["radius"]
-
-        # Apply the player light mask to the darkness surface
-        darkness.blit(player_light, (light_x, light_y), special_flags=pygame.BLEND_RGBA_SUB)
-
-        # Process light-emitting tiles
-        for light_tile in self.game.light_emitting_tiles:
-            # Get position and properties
+        """
+        Multiplies the display by a lightmap: the ambient light left by darkness_level plus every visible light,
+        in its own color. White lights look the same as the old darkness surface with subtracted alpha.
+        The lightmap is computed at 1 / game.lighting_resolution of the display size. Above 1 the scene is lit at that
+        size too and scaled back up once: the whole picture loses resolution, not only the lights, for the cheapest
+        frame. Static tile lights come from bake_static_lights.
+        """
+        display = self.game.display
+        width, height = display.get_size()
+        scale = self.game.lighting_resolution
+        size = (-(-width // scale), -(-height // scale))
+        lightmap = self.lightmap
+        if lightmap is None or lightmap.get_size() != size:
+            lightmap = self.lightmap = pygame.Surface(size)
+        ambient = 255 - self.game.darkness_level
+        lightmap.fill((ambient, ambient, ambient))
+
+        # Player light
+        player_pos = self.game.player.render_pos()
+        self.add_light(lightmap, self.game.player_light, (player_pos[0] + self.game.player.size[0] // 2,
+                                                          player_pos[1] + self.game.player.size[1] // 2),
+                       render_scroll, scale, "player")
+
+        # Static tile lights, baked by chunk
+        if self.baked_chunks is None or (self.baked_shadows and
+                                         self.baked_stamp != self.game.tilemap.collision_grid.stamp):
+            self.bake_static_lights()  # Only the shadows of the lights near the changed tiles are computed again
+        chunk_pixels = CHUNK_SIZE * self.game.tile_size
+        scroll_x, scroll_y = int(render_scroll[0]), int(render_scroll[1])
+        for cx in range(scroll_x // chunk_pixels, (scroll_x + width) // chunk_pixels + 1):
+            for cy in range(scroll_y // chunk_pixels, (scroll_y + height) // chunk_pixels + 1):
+                chunk = self.baked_chunk((cx, cy), scale)
+                if chunk is not None:
+                    chunk_pos = ((cx * chunk_pixels - scroll_x) / scale, (cy * chunk_pixels - scroll_y) / scale)
+                    lightmap.blit(chunk, chunk_pos, special_flags=pygame.BLEND_RGB_ADD)
+
+        # Flickering tile lights whose light reaches the screen
+        for index, light_tile in self.lights_in(render_scroll[0], render_scroll[1],
+                                                render_scroll[0] + width, render_scroll[1] + height):
             pos = light_tile["pos"]
-            light_type = light_tile.get("type", "torch")
-            properties = self.game.light_properties[light_type]
+            properties = self.game.light_properties[light_tile.get("type", "torch")]
+            radius = properties["radius"]
 
-            # Calculate screen position
             tile_screen_x = pos[0] - render_scroll[0]
             tile_screen_y = pos[1] - render_scroll[1]
 
-            # Check if the light is visible on screen (with buffer)
-            buffer = properties["radius"] * 2
-            if (-buffer <= tile_screen_x <= self.game.display.get_width() + buffer and
-                    -buffer <= tile_screen_y <= self.game.display.get_height() + buffer):
-                # Create light mask for this tile
-                tile_light = self.create_light_mask(
-                    properties["radius"],
-                    properties["color"],
-                    properties["intensity"],
-                    properties["edge_softness"],
-                    properties["flicker"]
-                )
-
-                # Apply light
-                light_pos = (tile_screen_x - properties["radius"], tile_screen_y - properties["radius"])
-                darkness.blit(tile_light, light_pos, special_flags=pygame.BLEND_RGBA_SUB)
-
-        # Process light-emitting objects (enemies, items, etc.)
+            if -radius <= tile_screen_x <= width + radius and -radius <= tile_screen_y <= height + radius:
+                self.add_light(lightmap, properties, pos, render_scroll, scale, ("tile", index))
+
+        # Light-emitting objects (enemies, items, etc.)
         for light_obj in self.game.light_emitting_objects:
             if hasattr(light_obj, "pos") and hasattr(light_obj, "light_properties"):
-                props = light_obj.light_properties
-
-                # Calculate screen position
-                obj_screen_x = light_obj.pos[0] - render_scroll[0]
-                obj_screen_y = light_obj.pos[1] - render_scroll[1]
-
-                # Create light mask for this object
-                obj_light = self.create_light_mask(
-                    props.get("radius", 80),
-                    props.get("color", (255, 255, 255)),
-                    props.get("intensity", 200),
-                    props.get("edge_softness", 30),
-                    props.get("flicker", False)
-                )
-
-                # Apply light
-                light_pos = (obj_screen_x - props["radius"], obj_screen_y - props["radius"])
-                darkness.blit(obj_light, light_pos, special_flags=pygame.BLEND_RGBA_SUB)
-
-        # Apply the darkness to the display
-        self.game.display.blit(darkness, (0, 0))
-
-    def register_light_emitting_tile(self, pos, light_type="torch"):
-        """Register a new light-emitting tile at the given position"""
+                self.add_light(lightmap, light_obj.light_properties, light_obj.pos, render_scroll, scale,
+                               light_obj)
+
+        # Single pass over the display: pixel * light / 255 (the additions above saturate at full light)
+        if scale == 1:
+            display.blit(lightmap, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+            return
+        reduced = self.reduced_display
+        if reduced is None or reduced.get_size() != size:
+            reduced = self.reduced_display = pygame.Surface(size)
+        pygame.transform.scale(display, size, reduced)
+        reduced.blit(lightmap, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+        pygame.transform.scale(reduced, (width, height), display)
+
+    def register_light_emitting_tile(self, pos, light_type="torch", from_tag=False):
+        """
+        Register a new light-emitting tile at the given position.
+        from_tag: registered by load_level from a "light" tag, it goes with the level
+        """
         if light_type in self.game.light_properties:
             self.game.light_emitting_tiles.append({
                 "pos": pos,
-                "type": light_type
+                "type": light_type,
+                "from_tag": from_tag
             })
+            self.baked_chunks = None  # Rebaked on the next frame
 
     def display_level_fg(self, map_id):
         if map_id in (0, 1, 2):
@@ -150,6 +293,21 @@ class Shader:
             obj.light_properties = properties
         self.game.light_emitting_objects.append(obj)
 
+    def unregister_light_emitting_object(self, obj):
+        if obj in self.game.light_emitting_objects:
+            self.game.light_emitting_objects.remove(obj)
+        self.forget_light(obj)
+
+    def forget_light(self, light_key):
+        """Drops the shadow caches of a light"""
+        self.shadowed_sprites.pop(light_key, None)
+        self.shadow_caster.forget(light_key)
+
+    def forget_lights(self):
+        """Drops the shadow caches of every light, on a level change (tile light indexes don't mean the same anymore)"""
+        self.shadowed_sprites = {}
+        self.shadow_caster.forget_all()
+
     def apply_chromatic_aberration(self, offset_x, offset_y):
         """
         Takes a surface and returns a new surface with chromatic aberration applied.
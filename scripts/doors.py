@@ -1,7 +1,4 @@
-import time
-
 import pygame
-import random
 
 from scripts.particle import Particle
 from scripts.spark import Spark
@@ -22,6 +19,7 @@ class Door:
         self.opening_speed = opening_speed
         self.last_time_interacted = 0
         self.id = d_id
+        self.bbox = pygame.Rect(pos[0], pos[1], size[0], size[1])  # Its collider while closed
 
         self.breaking_sound = pygame.mixer.Sound('assets/sounds/door_breaking.wav')
 
@@ -30,20 +28,20 @@ class Door:
 
         if self.type == 'breakable_stalactite' and self.game.attacking and self.rect().colliderect(
                 self.game.player.rect().inflate(32, 32)):
-            pos = (self.rect().x + random.random() * self.rect().width,
-                   self.rect().y + 5 + random.random() * self.rect().height)
+            pos = (self.rect().x + self.game.rng.random() * self.rect().width,
+                   self.rect().y + 5 + self.game.rng.random() * self.rect().height)
             self.game.particles.append(
                 Particle(self.game, 'crystal_fragment', pos, velocity=[-0.1, 1.2], frame=0))
             self.open()
 
         if self.action == "opening" and not self.opened:
-            if time.time() - self.last_time_interacted >= self.opening_speed:
+            if self.game.sim_time - self.last_time_interacted >= self.opening_speed:
                 self.set_action("opened")
                 self.opened = True
 
         if self.action == "closing":
             self.opened = False
-            if time.time() - self.last_time_interacted >= self.opening_speed:
+            if self.game.sim_time - self.last_time_interacted >= self.opening_speed:
                 self.set_action("closed")
 
         if not self.opened and self.action == "opened":
@@ -54,7 +52,7 @@ class Door:
     def open(self):#mainly useful for the state of door and sound play
         if not self.opened:
             self.set_action("opening")
-            self.last_time_interacted = time.time()
+            self.last_time_interacted = self.game.sim_time
 
             if self.type == 'breakable_stalactite':
                 self.breaking_sound.play()
@@ -62,7 +60,7 @@ class Door:
     def close(self):#not useful for the moment but might in the future
         if self.opened:
             self.set_action("closing")
-            self.last_time_interacted = time.time()
+            self.last_time_interacted = self.game.sim_time
 
     def rect(self):#is very useful because when the door is broken the player has to be able to go through the updated frame
         if self.action == "opened":
@@ -70,6 +68,9 @@ class Door:
         else:
             return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
 
+    def rects_in(self, area):
+        return [self.bbox]
+
     def set_action(self, action):#load the animation for door breaking
         if action != self.action:
             self.action = action
@@ -79,17 +80,20 @@ class Door:
         surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False),
                   (self.pos[0] - offset[0], self.pos[1] - offset[1]))
 
-def doors_render_and_update(game, render_scroll):
-    # Doors (Colliders updated for physics)
-    ds = []
+def doors_update(game):
+    # Doors (Colliders registered while closed)
     for door in game.doors:
         door.update()
+        if door.opened:
+            game.dynamic_colliders.remove(door)
+        else:
+            game.dynamic_colliders.add(door, "door")
+
+def doors_render(game, render_scroll):
+    for door in game.doors:
         door.render(game.display, offset=render_scroll)
-        if not door.opened:
-            ds.append(door.rect())
-            if game.player.show_hitbox:
-                k = door.rect().copy()
-                k.x -= render_scroll[0]
-                k.y -= render_scroll[1]
-                pygame.draw.rect(game.display, (255, 0, 0), k, 1)
-    game.doors_rects = ds
\ No newline at end of file
+        if not door.opened and game.player.show_hitbox:
+            k = door.rect().copy()
+            k.x -= render_scroll[0]
+            k.y -= render_scroll[1]
+            pygame.draw.rect(game.display, (255, 0, 0), k, 1)
\ No newline at end of file
@@ -29,9 +29,8 @@ class Spike(DamageBlock):
     def __init__(self, game_instance, pos, tile):
         super().__init__(game_instance, pos)
         tile_id, variant, rotation, flip_x, flip_y = game_instance.tilemap.tile_manager.unpack_tile(tile)
-        image = game_instance.tilemap.tile_manager.tiles[tile_id].images[variant]
-        image = pygame.transform.rotate(image, rotation * -90)
-        image = pygame.transform.flip(image, flip_x, flip_y)
+        # Own copy: a fake tile group holding this spike fades its image in place
+        image = game_instance.tilemap.tile_manager.get_transformed_img(tile).copy()
         self.rotation = rotation
         self.flip_x = flip_x
         self.flip_y = flip_y
@@ -175,7 +174,7 @@ def deal_dmg(game, source, target, att_dmg=5, att_time=1):
 
 def deal_knockback(entity, target, strenght, knockback=None, stun_duration=0.5):
     # Apply knockback force to targets when hit
-    stun_elapsed = time.time() - target.last_stun_time
+    stun_elapsed = target.game.sim_time - target.last_stun_time
     knockback_force = max(0, strenght * (1.0 - stun_elapsed / stun_duration))
 
     if not target.knockback_dir[0] and not target.knockback_dir[1] and knockback is None:
@@ -0,0 +1,125 @@
+"""
+The world the entities other than the player live in (enemies, projectiles, throwables...): one step moves all of them,
+gravity first as a single pass over every body, then their momentum.
+Bodies move with the swept tests of Entity (sweep_hit on the collision grid, slopes climbed), without the corner
+correction and the per-rect checks of collision_check that only the player's controls need, so hundreds of them fit
+in a tick. They are then indexed in a spatial hash, so they can look for each other without going through all of them.
+Nothing but the player moves on its own yet, so the game doesn't own a world and only the tests and the micro benchmarks
+build one: the first kind of entity that needs one creates it and steps it from Game._update_world.
+Bodies read the collision grid directly, they don't go through physics_candidates or the dynamic colliders.
+"""
+
+BUCKET_SIZE = 64  # pixels
+MAX_FALL_SPEED = 6.0  # Like Player.gravity
+
+
+class EntityWorld:
+    def __init__(self, game):
+        self.game = game
+        self.bodies = []
+        self.buckets = {}  # (bucket x, bucket y) -> bodies overlapping it, rebuilt every step
+
+    def add(self, body):
+        """body: an Entity. Its world_gravity attribute (default True) says whether the world makes it fall"""
+        self.bodies.append(body)
+        self.index_body(body)
+        return body
+
+    def remove(self, body):
+        self.bodies.remove(body)
+        for bucket in self.buckets.values():
+            if body in bucket:
+                bucket.remove(body)
+
+    def clear(self):
+        self.bodies = []
+        self.buckets = {}
+
+    def step(self, dt):
+        if not self.bodies:
+            return
+        self.apply_gravity(dt)
+        for body in self.bodies:
+            body.prev_pos[0], body.prev_pos[1] = body.pos
+            self.move(body, dt)
+        self.index_bodies()
+
+    def apply_gravity(self, dt):
+        """Like Player.gravity, the floor being the collision side found by the last move"""
+        for body in self.bodies:
+            if not getattr(body, "world_gravity", True):
+                continue
+            velocity = body.velocity
+            if body.GRAVITY_DIRECTION == 1:
+                if body.collision["bottom"] and velocity[1] >= 0:
+                    velocity[1] = 0
+                else:
+                    velocity[1] = min(MAX_FALL_SPEED, velocity[1] + body.GRAVITY_ACCELERATION * dt)
+            else:
+                if body.collision["top"] and velocity[1] <= 0:
+                    velocity[1] = 0
+                else:
+                    velocity[1] = max(-MAX_FALL_SPEED, velocity[1] - body.GRAVITY_ACCELERATION * dt)
+
+    def move(self, body, dt):
+        """
+        Moves body along x then y, stopping (velocity zeroed) on the first block in the way. body.collision tells the
+        sides stopped this step, plus the floor when the body rests on it.
+        """
+        collision = body.collision
+        for a, axe, negative_side, positive_side in ((0, "x", "left", "right"), (1, "y", "top", "bottom")):
+            collision[negative_side] = collision[positive_side] = False
+            move = body.velocity[a] * dt
+            rect = body.place(body.hitbox)
+            dist = round(body.pos[a] + move) - rect[a]
+            if not dist:
+                body.pos[a] += move
+                continue
+            travel, hit = body.sweep_hit(rect, axe, dist)
+            if a == 0:
+                travel, hit = body.climb_steps(rect, dist, travel, hit)
+            if hit is None:
+                body.pos[a] += move
+            else:
+                body.pos[a] = rect[a] + travel
+                body.velocity[a] = 0
+                collision[positive_side if dist > 0 else negative_side] = True
+
+        # Standing still (or only moving sideways) on the floor
+        floor_side = "bottom" if body.GRAVITY_DIRECTION == 1 else "top"
+        if not collision[floor_side]:
+            rect = body.place(body.hitbox)
+            collision[floor_side] = body.sweep_hit(rect, "y", body.GRAVITY_DIRECTION)[1] is not None
+
+    def index_bodies(self):
+        self.buckets = {}
+        for body in self.bodies:
+            self.index_body(body)
+
+    def index_body(self, body):
+        rect = body.rect
+        for bx in range(rect.left // BUCKET_SIZE, (rect.right - 1) // BUCKET_SIZE + 1):
+            for by in range(rect.top // BUCKET_SIZE, (rect.bottom - 1) // BUCKET_SIZE + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket is None:
+                    self.buckets[(bx, by)] = [body]
+                else:
+                    bucket.append(body)
+
+    def bodies_near(self, rect):
+        """Bodies in the buckets rect overlaps (as they were at the last step), each once"""
+        found = {}  # Insertion ordered, bodies spanning several buckets only once
+        for bx in range(rect.left // BUCKET_SIZE, (rect.right - 1) // BUCKET_SIZE + 1):
+            for by in range(rect.top // BUCKET_SIZE, (rect.bottom - 1) // BUCKET_SIZE + 1):
+                for body in self.buckets.get((bx, by), ()):
+                    found[body] = None
+        return list(found)
+
+    def colliding(self, rect):
+        """Bodies whose hitbox overlaps rect"""
+        return [body for body in self.bodies_near(rect) if body.rect.colliderect(rect)]
+
+    def render(self, surf, offset=(0, 0)):
+        for body in self.bodies:
+            if hasattr(body, "render"):
+                body.render(surf, offset)
@@ -15,10 +15,8 @@ class FakeTilesGroup:
                 self.group[fake_tile_loc] = {"tile": tile, "pos": tile.pos, "img": tile.image, "layer": layer}
                 continue
             pos = [float(val)*game_instance.tile_size for val in fake_tile_loc.split(";")]
-            tile_id, variant, rotation, flip_x, flip_y = self.game.tilemap.tile_manager.unpack_tile(tile)
-            img = self.game.tilemap.tile_manager.tiles[tile_id].images[variant]
-            img = pygame.transform.rotate(img, rotation * -90)
-            img = pygame.transform.flip(img, flip_x, flip_y)
+            # Own copy, the image is faded in place while the group disappears
+            img = self.game.tilemap.tile_manager.get_transformed_img(tile).copy()
             self.group[fake_tile_loc] = {"tile": tile, "pos": pos, "img": img, "layer": layer}
         self.opacity = 255
 
@@ -39,6 +37,9 @@ class FakeTilesGroup:
 
         if self.game.fake_tiles_colliding_group == self:
             self.opacity = max(0, self.opacity - 30)
+            # Faded once per tick, not per frame drawn
+            for fake_tile in self.group.values():
+                fake_tile["img"].fill((255, 255, 255, self.opacity), special_flags=pygame.BLEND_RGBA_MULT)
 
         if self.opacity == 0:
             self.game.fake_tiles.remove(self)
@@ -49,5 +50,4 @@ class FakeTilesGroup:
         for fake_tile_loc in self.group:
             pos = self.group[fake_tile_loc]["pos"]
             img = self.group[fake_tile_loc]["img"]
-            img.fill((255, 255, 255, self.opacity), special_flags=pygame.BLEND_RGBA_MULT)
             surf.blit(img, (pos[0] - offset[0], pos[1] - offset[1]))
@@ -15,18 +15,21 @@ from scripts.particle import update_particles, particle_render
 from scripts.activators import *
 from scripts.user_interface import Menu
 from scripts.saving import Save
-from scripts.doors import Door, doors_render_and_update
+from scripts.doors import Door, doors_update, doors_render
+from scripts.colliders import ColliderRegistry
 from scripts.display import *
 from scripts.camera import Camera
 from scripts.text import load_game_texts, update_bottom_text
 from scripts.sound import Sound
 from scripts.pickup import Pickup
+from scripts.replay import InputRecorder, DEFAULT_REPLAY_PATH
 
 class LevelManager:
 
     ROLE_TAGS = {"lever", "door", "spike", "checkpoint"}
     STATE_TAGS = {"fake_tile", "sinking"}
     TAGS = ROLE_TAGS.union(STATE_TAGS)
+    LIGHT_TAG = "light"  # Info "type": a light_properties key. The tile stays in the tilemap
 
 
     def __init__(self, game):
@@ -53,6 +56,20 @@ class LevelManager:
 
 
 
+    def register_tile_lights(self, tagged_tiles):
+        # Only the lights of the previous level's tags go, the ones registered by code stay
+        self.game.light_emitting_tiles = [light_tile for light_tile in self.game.light_emitting_tiles
+                                          if not light_tile.get("from_tag")]
+        self.game.shader.forget_lights()
+        for (tile_loc, tile_layer), group_ids in tagged_tiles.items():
+            for group_id in group_ids:
+                light_infos = self.game.tilemap.tag_groups[group_id]["tags"].get(self.LIGHT_TAG)
+                if light_infos is not None:
+                    pos = [(float(val) + 0.5) * self.game.tile_size for val in tile_loc.split(";")]
+                    self.game.shader.register_light_emitting_tile(pos, light_infos.get("type") or "torch",
+                                                                  from_tag=True)
+                    break
+
     def load_level(self, level_id):
         self.update_map(level_id)
 
@@ -63,16 +80,25 @@ class LevelManager:
         self.game.spikes = []
         self.game.fake_tiles = []
         self.game.sinking = []
+        self.game.dynamic_colliders.clear()
         self.game.pickups = []
         self.game.leaf_spawners = []
         self.game.camera_zones = []
 
         tagged_tiles = self.get_tagged_tiles()
+        # Tiles (or the objects replacing them) handed over from role tags to state tags.
+        # Kept aside rather than written back, the chunked tilemap only stores packed tiles
+        state_tiles = {}
+
+        self.register_tile_lights(tagged_tiles)
 
         #ROLE_TAGS before
         for tile_loc, tile_layer in tagged_tiles:
-            tile_space = self.game.tilemap.get_tile_space(tile_loc, tile_layer)
-            tile = self.game.tilemap.extract(tile_loc, tile_layer)
+            tile_tags = set()
+            for group_id in tagged_tiles[(tile_loc, tile_layer)]:
+                tile_tags.update(self.game.tilemap.tag_groups[group_id]["tags"])
+            # Only tiles replaced by game objects leave the tilemap (not the lights for example)
+            tile = self.game.tilemap.extract(tile_loc, tile_layer, keep=not tile_tags.intersection(self.TAGS))
             new_tile = tile
             pos = [float(val) * self.game.tile_size for val in tile_loc.split(";")]
             for group_id in tagged_tiles[(tile_loc, tile_layer)]:
@@ -95,17 +121,13 @@ class LevelManager:
                     break
 
             if check:
-                if tile_space == "tilemap":
-                    self.game.tilemap.tilemap[tile_layer][tile_loc] = new_tile
-                elif tile_space == "offgrid":
-                    self.game.tilemap.offgrid_tiles[tile_layer][tile_loc] = new_tile
+                state_tiles[(tile_loc, tile_layer)] = new_tile
 
         #STATE TAGS after
         fake_tile_groups = {}
         sinking_groups = {}
         for tile_loc, tile_layer in tagged_tiles:
-            tile_space = self.game.tilemap.get_tile_space(tile_loc, tile_layer)
-            tile = self.game.tilemap.extract(tile_loc, tile_layer)
+            tile = state_tiles.get((tile_loc, tile_layer))
             new_tile = tile
             pos = [float(val) * self.game.tile_size for val in tile_loc.split(";")]
             for group_id in tagged_tiles[(tile_loc, tile_layer)]:
@@ -113,17 +135,13 @@ class LevelManager:
                 group_tags = group["tags"]
                 if set(group_tags).intersection(self.STATE_TAGS) == set():
                     continue
-                if group_id not in fake_tile_groups:
-                    fake_tile_groups[group_id] = {}
-                if group_id not in sinking_groups:
-                    sinking_groups[group_id] = {}
-
+                # A group only gets the kind of its own tag, a sinking group can't be empty
                 if "fake_tile" in group_tags:
-                    fake_tile_groups[group_id][tile_loc] = (tile, tile_layer)
+                    fake_tile_groups.setdefault(group_id, {})[tile_loc] = (tile, tile_layer)
                     self.game.layers["fake_tile"].add(tile_layer)
 
                 elif "sinking" in group_tags:
-                    sinking_groups[group_id][tile_loc] = (tile, tile_layer)
+                    sinking_groups.setdefault(group_id, {})[tile_loc] = (tile, tile_layer)
                     self.game.layers["sinking"].add(tile_layer)
 
 
@@ -152,6 +170,8 @@ class LevelManager:
         self.game.transition = -30
         self.game.max_falling_depth = 50000000000
         self.game.shader.update_light()
+        self.game.shader.bake_static_lights()
+        self.game.resume_clock()  # The loading time isn't played
 
 class Game:
     """
@@ -170,7 +190,18 @@ class Game:
     SCREEN_WIDTH = 960
     SCREEN_HEIGHT = 600
 
-    def __init__(self):
+    # --- Timing ---
+    # The world always steps by dt = 1 (one simulation tick), frames are drawn in between
+    SIMULATION_RATE = 60  # ticks per second
+    FRAME_RATE = 60  # Render cap, fixed. Frames drawn between two ticks are interpolated (see render_alpha)
+    MAX_STEPS_PER_FRAME = 5  # Past this the game slows down instead of freezing to catch up
+
+    def __init__(self, headless=False):
+        # Headless: no window, no sound and no menu. Levels are started with start_headless and driven with step
+        self.headless = headless
+        if headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
         pygame.init()
 
         self.level_manager = LevelManager(self)
@@ -180,14 +211,20 @@ class Game:
         self._init_sound()
         self._init_settings()
         self._init_runtime_state()
-        self.menu = Menu(self)
+        self.menu = None if headless else Menu(self)
 
     def _init_display(self):
         pygame.display.set_caption("Anima")
-        self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
+        if self.headless:
+            # Images still need a video mode to be converted
+            self.screen = pygame.display.set_mode((1, 1))
+        else:
+            self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
         self.display = pygame.Surface((self.SCREEN_WIDTH / 2, self.SCREEN_HEIGHT / 2))
         self.clock = pygame.time.Clock()
         self.debug_mode = False
+        if self.headless:
+            return
         try:
             icon = pygame.image.load("assets/images/ui/logo.png").convert_alpha()
             pygame.display.set_icon(pygame.transform.smoothscale(icon, (16, 16)))
@@ -198,7 +235,7 @@ class Game:
         try:
             if not pygame.mixer.get_init():
                 pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=2048)
-            self.sound_running = True
+            self.sound_running = not self.headless
         except Exception as e:
             print(f"Error initializing sound: {e}")
             self.sound_running = False
@@ -228,6 +265,7 @@ class Game:
         self.fullscreen = False
         self.vsync_on = False
         self.brightness = 0.5
+        self.lighting_resolution = 1  # Lightmap size divider: 1, 2 or 4
         self.keyboard_layout = "AZERTY"
         self.key_map = {
             "key_up": pygame.K_z, "key_down": pygame.K_s,
@@ -275,6 +313,19 @@ class Game:
         self.scroll_limits = {}
         self.screenshake = 0
         self.scroll = [0.0, 0.0]
+        self.prev_scroll = [0.0, 0.0]
+
+        # Fixed timestep
+        self.sim_time = 0.0  # Seconds of simulated game time, gameplay timers use it instead of time.time()
+        self.ticks = 0  # Simulation ticks so far, for the caches valid for one tick (Entity.contacts)
+        self.step_accumulator = 0.0  # ms not simulated yet
+        self.drawn_state = None  # State of the last frame drawn by run, the clock restarts when play comes back
+        self.render_alpha = 1.0  # How far the frame is between the last two ticks
+
+        # Determinism (see scripts/replay.py)
+        self.seed_rng()
+        self.recorder = None
+        self.replay_path = None  # Where F9 saves recordings, given by main.py --record (debug mode otherwise)
         self.scroll_limits = {"x": [-5000, 5000], "y": [-5000, 5000]}
 
         # Player
@@ -293,7 +344,8 @@ class Game:
 
         # Activators / interactables
         self.sinking_colliding_group = None
-        self.sinking_rects = []
+        self.sinking = []
+        self.dynamic_colliders = ColliderRegistry()  # Doors and sinking groups, see colliders.py
         self.activators = []
         self.spawners = {}
         self.spawner_pos = {}
@@ -310,7 +362,6 @@ class Game:
         self.attacking = False
         self.holding_attack = False
         self.transitions = []
-        self.doors_rects = []
         self.layers = {}
 
         # Lighting
@@ -339,15 +390,18 @@ class Game:
         self.light_soft_edge = 200
         self.light_emitting_tiles = []
         self.light_emitting_objects = []
+        # "shadows": the light is blocked by solid tiles (see scripts/shadows.py)
         self.light_properties = {
             "player": {"radius": 100, "intensity": 250, "edge_softness": 255, "color": (255, 255, 255),
-                       "flicker": False},
-            "torch": {"radius": 80, "intensity": 220, "edge_softness": 30, "color": (255, 180, 100), "flicker": True},
+                       "flicker": False, "shadows": False},
+            "torch": {"radius": 80, "intensity": 220, "edge_softness": 30, "color": (255, 180, 100), "flicker": True,
+                      "shadows": False},
             "crystal": {"radius": 120, "intensity": 200, "edge_softness": 50, "color": (100, 180, 255),
-                        "flicker": False},
+                        "flicker": False, "shadows": False},
             "glowing_mushroom": {"radius": 80, "intensity": 80, "edge_softness": 500, "color": (160, 230, 180),
-                                 "flicker": False},
-            "lava": {"radius": 100, "intensity": 210, "edge_softness": 40, "color": (255, 120, 50), "flicker": True},
+                                 "flicker": False, "shadows": False},
+            "lava": {"radius": 100, "intensity": 210, "edge_softness": 40, "color": (255, 120, 50), "flicker": True,
+                     "shadows": False},
         }
         self.light_infos = {i: {"darkness_level": 180, "light_radius": 200} for i in range(5)}
         self.player_light = self.light_properties["player"]
@@ -382,9 +436,9 @@ class Game:
             self.menu.menu_state = self.menu.PAUSE_STATE
             for key in self.dict_kb: self.dict_kb[key] = 0
         elif event.key == self.key_map["key_interact"]:
-            update_throwable_objects_action(self)
-            if not self.player_grabbing:
-                update_activators_actions(self)
+            if self.recorder is not None:
+                self.recorder.record_interact()
+            self.interact()
         elif event.key == pygame.K_F11:
             toggle_fullscreen(self)
         elif event.key == pygame.K_f and not self.holding_attack:
@@ -394,6 +448,8 @@ class Game:
             self.toggle_hitboxes()
         elif event.key == pygame.K_r:
             kill_player(self)
+        elif event.key == pygame.K_F9 and (self.replay_path or self.debug_mode):
+            self.toggle_recording()
 
     def _handle_keyup(self, event):
         if event.type != pygame.KEYUP:
@@ -512,18 +568,125 @@ class Game:
 
 
     def main_game_logic(self):
-        raw_dt = self.clock.tick(60)
-        dt = 1#min(raw_dt / (1000.0 / 60.0), 3.0)
+        raw_dt = self.clock.tick(self.FRAME_RATE)
+        step_time = 1000.0 / self.SIMULATION_RATE
+
+        # Fixed timestep: as many ticks as the real time elapsed asks for, whatever the frame rate
+        self.step_accumulator = min(self.step_accumulator + raw_dt, step_time * self.MAX_STEPS_PER_FRAME)
+        while self.step_accumulator >= step_time:
+            self.step_accumulator -= step_time  # Before the tick, a level load in it starts the clock over
+            self._update_world(1)
+        self.render_alpha = self.step_accumulator / step_time
 
-        self._update_world(dt)
         self._render_world()
         self._render_ui()
 
         if not self._handle_events():
+            self.stop_recording()
             pygame.quit()
             sys.exit()
 
+    def resume_clock(self):
+        """
+        Starts the frame clock over: the time spent out of play (menus, level loading) isn't simulated, it would
+        make the game run MAX_STEPS_PER_FRAME ticks at once on the first frame back
+        """
+        self.clock.tick()
+        self.step_accumulator = 0.0
+
+    def start_headless(self, level_id=None):
+        """Loads a level straight into PLAYING_STATE, without menu or save slot"""
+        if level_id is not None:
+            self.level_id = level_id
+        self.level = f"{self.level_id:03d}"
+        self.level_manager.load_level(self.level_id)
+        self.state = self.PLAYING_STATE
+        self.start_time = time.time()
+
+    def step(self, dict_kb=None, ticks=1):
+        """Headless game loop: runs ticks simulation ticks back to back, nothing is drawn or waited for"""
+        if dict_kb is not None:
+            self.dict_kb.update(dict_kb)
+        for _ in range(ticks):
+            self._update_world(1)
+            if self.player_dead:
+                self._headless_respawn()
+
+    def restart_level(self, level_id, player_pos):
+        """
+        The level as it is when entered: reloaded, a new player at player_pos, no simulation time elapsed and no
+        input held. Nothing of what happened before is left in the simulation (see InputRecorder)
+        """
+        self.level_id = level_id
+        self.level = f"{level_id:03d}"
+        self.player = Player(self, self.tilemap, tuple(player_pos), (16, 16))
+        self.player_dead = False
+        self.sim_time = 0.0
+        self.step_accumulator = 0.0
+        self.screenshake = 0
+        self.moving_visual = False
+        self.sinking_colliding_group = None
+        self.fake_tiles_colliding_group = []
+        self.scroll_limits = {"x": [-5000, 5000], "y": [-5000, 5000]}
+        for key in self.dict_kb:
+            self.dict_kb[key] = 0
+        self.level_manager.load_level(level_id)
+        self.prev_scroll = list(self.scroll)
+
+    def _headless_respawn(self):
+        """death_handling without the death screen and the save reload: back to the spawn point"""
+        self.player_dead = False
+        self.player.pos = list(self.spawn_point["pos"])
+        self.player.velocity = [0, 0]
+        self.player.dash_amt = 1
+        self.player.dashtime_cur = 0
+
+    def seed_rng(self, seed=None):
+        """
+        Reseeds the game's RNGs. A random seed is drawn if none is given.
+        rng is the simulation's (particles, fragments), replays depend on it. render_rng is for what only changes the
+        frames (light flicker, screenshake): the number of frames drawn per tick varies, it must not touch rng.
+        """
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.render_rng = random.Random(seed + 1)
+        return seed
+
+    def start_recording(self, path, seed=None):
+        """Restarts the level (see restart_level) and records every tick's inputs from there, saved by stop_recording"""
+        self.recorder = InputRecorder(self, path, seed)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.save()
+            self.recorder = None
+
+    def toggle_recording(self):
+        """F9: starts a recording (the level restarts), or stops and saves the current one"""
+        if self.recorder is not None:
+            self.stop_recording()
+            return
+        path = self.replay_path or DEFAULT_REPLAY_PATH
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.start_recording(path)
+
+    def interact(self):
+        update_throwable_objects_action(self)
+        if not self.player_grabbing:
+            update_activators_actions(self)
+
     def _update_world(self, dt):
+        self.sim_time += dt / self.SIMULATION_RATE
+        self.ticks += 1
+        if self.recorder is not None:
+            self.recorder.record(self.dict_kb)
+
+        # Last tick's state, frames are interpolated from it
+        self.prev_scroll = list(self.scroll)
+        self.player.prev_pos = list(self.player.pos)
+
         self._camera_borders_check()
         self.camera.update_camera()
 
@@ -532,6 +695,11 @@ class Game:
         self._update_fake_tiles()
         self._update_sinking(dt)
         self.player.physics_process(self.dict_kb, dt)
+        self.player.update_walljump_fatigue()
+        doors_update(self)
+        update_particles(self, (round(self.scroll[0]), round(self.scroll[1])))
+        self._update_transition()
+        self.screenshake = max(0, self.screenshake - 1)
 
 
         self.update_transitions()
@@ -539,7 +707,7 @@ class Game:
             self.start_time = time.time()
 
     def _render_world(self):
-        render_scroll = (round(self.scroll[0]), round(self.scroll[1]))
+        render_scroll = tuple(lerp_pos(self.prev_scroll, self.scroll, self.render_alpha))
         display_level_bg(self, self.level_id)
         for layer in self.tilemap.tilemap:
             self.tilemap.render(self.display, layer, offset=render_scroll)
@@ -563,10 +731,9 @@ class Game:
 
 
 
-        doors_render_and_update(self, render_scroll)
+        doors_render(self, render_scroll)
         render_activators(self, render_scroll)
         #self.spike_hitbox_update(render_scroll)
-        update_particles(self, render_scroll)
         particle_render(self, render_scroll)
         self.shader.display_level_fg(self.level)
         self.shader.apply_lighting(render_scroll)
@@ -580,25 +747,24 @@ class Game:
         death_handling(self, self.screen)
         self._finalize_frame()
 
-    def _render_transition(self):
+    def _update_transition(self):
         if self.transition < 0:
             self.transition += 2
+        self.player.disablePlayerInput = bool(self.transition)
+
+    def _render_transition(self):
         if self.transition:
-            self.player.disablePlayerInput = True
             surf = pygame.Surface(self.display.get_size())
             pygame.draw.circle(surf, (255, 255, 255),
                                (self.display.get_width() // 2, self.display.get_height() // 2),
                                (30 - abs(self.transition)) * 8)
             surf.set_colorkey((255, 255, 255))
             self.display.blit(surf, (0, 0))
-        else:
-            self.player.disablePlayerInput = False
 
     def _render_screenshake(self):
-        self.screenshake = max(0, self.screenshake - 1)
         offset = (
-            random.random() * self.screenshake - self.screenshake / 2,
-            random.random() * self.screenshake - self.screenshake / 2,
+            self.render_rng.random() * self.screenshake - self.screenshake / 2,
+            self.render_rng.random() * self.screenshake - self.screenshake / 2,
         )
         self.screen.blit(
             pygame.transform.scale(self.display, self.screen.get_size()), offset
@@ -621,12 +787,16 @@ class Game:
         self.load_settings()
         pygame.mouse.set_visible(False)
         while True:
-            match self.state:
+            state = self.state
+            match state:
                 case self.MENU_STATE:
                     self.menu.draw()
                 case self.PLAYING_STATE:
+                    if self.drawn_state != self.PLAYING_STATE:
+                        self.resume_clock()  # Back from the title screen or the pause menu
                     self.main_game_logic()
                     self.menu.draw_player_souls()
+            self.drawn_state = state
             self.apply_brightness()
             pygame.display.update()
 
@@ -646,9 +816,13 @@ class Game:
         self.screen.blit(overlay, (0, 0))
 
     def play_music(self, name):
+        if self.headless:
+            return
         self.music_sound_manager.play(name=name, loops=-1)
 
     def play_se(self, name):
+        if self.headless:
+            return
         self.sound_effect_manager.play(name=name)
 
     def update_music_volume(self, volume):
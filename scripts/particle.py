@@ -1,5 +1,3 @@
-import random
-
 class Particle:
     def __init__(self, game, p_type, pos, velocity=None, frame=0):
         if velocity is None:
@@ -32,14 +30,16 @@ def update_particles(game, render_scroll):
     for rect in game.leaf_spawners:
         if not game.tilemap.pos_visible(game.display, (rect.x, rect.y), offset=render_scroll, additional_offset=(100, 100)):
             continue
-        if random.random() * 49999 < rect.width * rect.height:
-            pos = (rect.x + random.random() * rect.width, rect.y + random.random() * rect.height)
-            game.particles.append(Particle(game, 'leaf', pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
+        if game.rng.random() * 49999 < rect.width * rect.height:
+            pos = (rect.x + game.rng.random() * rect.width, rect.y + game.rng.random() * rect.height)
+            game.particles.append(Particle(game, 'leaf', pos, velocity=[-0.1, 0.3], frame=game.rng.randint(0, 20)))
 
-def particle_render(game, render_scroll):
     for particle in game.particles[:]:
         if not game.tilemap.pos_visible(game.display, particle.pos, offset=render_scroll, additional_offset=(100, 100)):
             game.particles.remove(particle)
             continue
         if particle.update(): game.particles.remove(particle)
+
+def particle_render(game, render_scroll):
+    for particle in game.particles:
         particle.render(game.display, offset=render_scroll)
\ No newline at end of file
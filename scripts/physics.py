@@ -6,16 +6,20 @@ from typing import override
 
 from scripts.sound import *
 from scripts.entities import deal_knockback
+from scripts.tile_chunks import COLLISION_SOLID, COLLISION_ONE_WAY, COLLISION_PARTIAL, SLOPE_STEPS
+from scripts.utils import lerp_pos
 
 
 class Entity:
     GRAVITY_ACCELERATION = 0.35
     GRAVITY_DIRECTION = 1
     COLLISION_DODGED_PIXELS = 4  # Number of pixels collision can dodge (ledge snapping/corner correction)
+    SWEPT_COLLISION = False  # Resolve every move with sweep_momentum (continuous collision) instead of move-then-resolve
 
     def __init__(self, game, tilemap, pos, size):
         self.game = game
         self.pos = list(pos)  # [x, y]
+        self.prev_pos = list(pos)  # pos at the previous tick, for render interpolation
         self.size = size
         self.velocity: list[int | float] = [0, 0]  # [vel_x, vel_y]
         self.acceleration = [0.0, 0.0]
@@ -29,19 +33,82 @@ class Entity:
 
         # Hitbox util vars
         self.show_hitbox = False
+        self.swept_collision = self.SWEPT_COLLISION
+
+        # Broadphase: tiles gathered once around the whole move, see physics_rects
+        self.broadphase_bounds = None
+        self.broadphase_version = None
+        self.broadphase_colliders = []
+
+        # Collider lists reused while nothing they depend on changes, see physics_rects
+        self.colliders_key = None
+        self.colliders = None
+
+        # See contacts
+        self.contacts_key = None
+        self.contacts_state = {"floor": False, "ceiling": False, "left": False, "right": False}
+
+        # Rects moved in place by the collision code instead of new ones for every test
+        self.hitbox = pygame.Rect(0, 0, size[0], size[1])  # collision_check's hitbox, before resolution
+        self.probe = pygame.Rect(0, 0, size[0], size[1])  # Hitbox queries and shifted hitboxes
+        self.contacts_rect = pygame.Rect(0, 0, size[0], size[1])
+        self.sweep_area = pygame.Rect(0, 0, 0, 0)  # What sweep_hit crosses
 
     @property
     def rect(self):
         return pygame.Rect(round(self.pos[0]), round(self.pos[1]), self.size[0], self.size[1])
 
+    def place(self, rect, dx=0, dy=0):
+        """Moves rect (in place) onto the hitbox, shifted by dx, dy. Same as self.rect.move(dx, dy)"""
+        rect.update(round(self.pos[0]) + dx, round(self.pos[1]) + dy, self.size[0], self.size[1])
+        return rect
+
+    def render_pos(self):
+        """Where to draw the entity this frame, between its last two ticks"""
+        return lerp_pos(self.prev_pos, self.pos, self.game.render_alpha)
+
+    def gather_colliders(self, bounds):
+        """Collects the tiles of a box big enough for this tick's move, nudges included"""
+        tilemap = self.tilemap
+        reach = abs(self.velocity[0]) + abs(self.velocity[1]) + self.COLLISION_DODGED_PIXELS
+        margin = 1 + int(reach // tilemap.tile_size)
+        self.broadphase_bounds = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+        self.broadphase_version = tilemap.collision_version
+        self.broadphase_colliders = tilemap.physics_candidates(*self.broadphase_bounds)
+
+    def physics_rects(self, hitbox, include_solid=True):
+        """tilemap.physics_rects_around, answered from the gathered colliders while the hitbox stays in their box"""
+        tilemap = self.tilemap
+        bounds = tilemap.neighbor_bounds(hitbox, self.GRAVITY_DIRECTION)
+        cached = self.broadphase_bounds
+        if (cached is None or self.broadphase_version != tilemap.collision_version or
+                bounds[0] < cached[0] or bounds[1] < cached[1] or bounds[2] > cached[2] or bounds[3] > cached[3]):
+            self.gather_colliders(bounds)
+        game = self.game
+        if not include_solid or not game.player.collide_with_passable_blocks:
+            # One-way tiles can get switched on by the query (see transparent_tile_check), it can't be reused
+            return tilemap.collider_rects(self.broadphase_colliders, bounds, hitbox, self.GRAVITY_DIRECTION,
+                                          include_solid)
+        # The same list as long as the box, the tiles, the tick and the dynamic colliders are the same
+        key = (bounds, game.ticks, self.broadphase_version, self.GRAVITY_DIRECTION, id(game.dynamic_colliders),
+               game.dynamic_colliders.version)
+        if key != self.colliders_key:
+            self.colliders = tilemap.collider_rects(self.broadphase_colliders, bounds, hitbox, self.GRAVITY_DIRECTION)
+            self.colliders_key = key
+        return self.colliders
+
     def _nudge_condition(self, rect):
-        return rect not in self.game.doors_rects
+        return not self.game.dynamic_colliders.is_kind(rect, "door")
 
     def _collision_actions(self, axe):
         return
 
     def apply_momentum(self, dt):
         """Applies velocity to the coords of the object. Slows down movement depending on environment"""
+        # A step of a whole tile could jump over a block with the move-then-resolve check, those are always swept
+        if self.swept_collision or max(abs(self.velocity[0]), abs(self.velocity[1])) * dt >= self.tilemap.tile_size:
+            self.sweep_momentum(dt)
+            return
 
         self.pos[0] += self.velocity[0] * dt
         self.collision_check("x", dt)
@@ -51,23 +118,18 @@ class Entity:
 
     def collision_check(self, axe, dt):
         """Checks for collision using tilemap"""
-        entity_rect = self.rect
-        tilemap = self.tilemap
-        b_r = set()
-        b_l = set()
-        b_t = set()
-        b_b = set()
+        # The hitbox from before the resolution, moved in place. self.probe is the hitbox at the current pos
+        entity_rect = self.place(self.hitbox)
+        probe = self.probe
+
+        self._reset_collision(axe)
 
         # Handle Vertical Collision First
         if axe == "y":
+            block_under = False
+            block_over = False
 
-            if self.velocity[1] > 0 or not self.get_block_on["bottom"]:
-                self.collision["bottom"] = False
-            if self.velocity[1] < 0 or not self.get_block_on["top"]:
-                self.collision["top"] = False
-
-
-            for rect in tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION):
+            for rect in self.physics_rects(self.place(probe)):
                 if entity_rect.colliderect(rect):
                     if (self.GRAVITY_DIRECTION == 1 and self.velocity[1] > 0) or (
                             self.GRAVITY_DIRECTION == -1 and self.velocity[1] < 0):
@@ -76,21 +138,13 @@ class Entity:
                         nudged = False
                         if self._nudge_condition(rect):
                             for i in range(1, self.COLLISION_DODGED_PIXELS + 1):
-                                right_shifted_hitbox_rect = pygame.Rect(round(self.pos[0]) + i, round(self.pos[1]), self.size[0],
-                                                    self.size[1])
-                                if not any(
-                                        right_shifted_hitbox_rect.colliderect(r)
-                                        for r in tilemap.physics_rects_around(right_shifted_hitbox_rect,
-                                                                             self.GRAVITY_DIRECTION)):
+                                # Check Right nudge
+                                if self.place(probe, i, 0).collidelist(self.physics_rects(probe)) == -1:
                                     self.pos[0] += i
                                     nudged = True
                                     break
                                 # Check Left nudge
-                                left_shifted_hitbox_rect = pygame.Rect(round(self.pos[0]) - i, round(self.pos[1]), self.size[0],
-                                                    self.size[1])
-                                if not any(left_shifted_hitbox_rect.colliderect(r)
-                                        for r in tilemap.physics_rects_around(left_shifted_hitbox_rect,
-                                                                             self.GRAVITY_DIRECTION)):
+                                if self.place(probe, -i, 0).collidelist(self.physics_rects(probe)) == -1:
                                     self.pos[0] -= i
                                     nudged = True
                                     break
@@ -103,16 +157,10 @@ class Entity:
                                 self.pos[1] = rect.bottom
                                 self.collision['top'] = True
 
-                block_under_entitys_feet = ((self.GRAVITY_DIRECTION == 1 and entity_rect.y + self.size[
-                    1] >= rect.y > entity_rect.y and entity_rect.x + self.size[
-                         0] > rect.x and entity_rect.x < rect.x + rect.width) or
-                        (self.GRAVITY_DIRECTION == -1 and entity_rect.y > rect.y >= entity_rect.y - self.size[
-                            1] and entity_rect.x + self.size[0] > rect.x and entity_rect.x < rect.x + rect.width))
-
-                if block_under_entitys_feet:
-                    b_b.add(True)
+                if self._block_under(entity_rect, rect):
+                    block_under = True
 
-            for rect in tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION):
+            for rect in self.physics_rects(self.place(probe)):
                 if entity_rect.colliderect(rect):
                     if (self.GRAVITY_DIRECTION == 1 and self.velocity[1] < 0) or (
                             self.GRAVITY_DIRECTION == -1 and self.velocity[1] > 0):
@@ -121,22 +169,12 @@ class Entity:
                         if self._nudge_condition(rect):
                             for i in range(1, self.COLLISION_DODGED_PIXELS + 1):
                                 # Try nudging Right
-                                right_shifted_hitbox_rect = pygame.Rect(round(self.pos[0]) + i, round(self.pos[1]), self.size[0],
-                                                    self.size[1])
-                                if not any(
-                                        right_shifted_hitbox_rect.colliderect(r)
-                                        for r in
-                                        tilemap.physics_rects_around(right_shifted_hitbox_rect, self.GRAVITY_DIRECTION)):
+                                if self.place(probe, i, 0).collidelist(self.physics_rects(probe)) == -1:
                                     self.pos[0] += i
                                     nudged = True
                                     break
                                 # Try nudging Left
-                                left_shifted_hitbox_rect = pygame.Rect(round(self.pos[0]) - i, round(self.pos[1]), self.size[0],
-                                                    self.size[1])
-                                if not any(
-                                        left_shifted_hitbox_rect.colliderect(r)
-                                        for r in
-                                        tilemap.physics_rects_around(left_shifted_hitbox_rect, self.GRAVITY_DIRECTION)):
+                                if self.place(probe, -i, 0).collidelist(self.physics_rects(probe)) == -1:
                                     self.pos[0] -= i
                                     nudged = True
                                     break
@@ -152,49 +190,39 @@ class Entity:
                             self._collision_actions(axe)
 
 
-                block_on_entitys_head = ((self.GRAVITY_DIRECTION == 1 and entity_rect.y - self.size[
-                    1] <= rect.y < entity_rect.y and entity_rect.x + self.size[
-                         0] > rect.x and entity_rect.x < rect.x + rect.width) or
-                        (self.GRAVITY_DIRECTION == -1 and entity_rect.y <= rect.y < entity_rect.y + self.size[
-                            1] and entity_rect.x + self.size[0] > rect.x and entity_rect.x < rect.x + rect.width))
-
-                if block_on_entitys_head:
-                    b_t.add(True)
+                if self._block_over(entity_rect, rect):
+                    block_over = True
 
             if self.is_on_floor():
                 self.pos[1] = round(self.pos[1])
 
-            self.get_block_on["top"] = bool(b_t)
-            self.get_block_on["bottom"] = bool(b_b)
+            self.get_block_on["top"] = block_over
+            self.get_block_on["bottom"] = block_under
 
         if axe == "x":
-            if int(self.velocity[0]) > 0 or not self.get_block_on["left"] or self.velocity[0] == 0:
-                self.collision["left"] = False
-            if int(self.velocity[0]) < 0 or not self.get_block_on["right"] or self.velocity[0] == 0:
-                self.collision["right"] = False
-
-            for rect in tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION):
+            for rect in self.physics_rects(self.place(probe)):
                 if entity_rect.colliderect(rect):
+                    # --- SLOPES: walking onto a step of it ---
+                    lift = self._step_up(entity_rect, rect) * self.GRAVITY_DIRECTION
+                    if lift:
+                        probe.update(entity_rect)
+                        probe.y -= lift
+                        if not self.sweep_overlaps(probe):
+                            self.pos[1] -= lift
+                            entity_rect.y -= lift
+                            continue
                     # --- HORIZONTAL CORNER CORRECTION ---
                     # If hitting a wall, try to nudge the player Up or Down to bypass the corner
                     nudged = False
                     if self._nudge_condition(rect):
                         for i in range(1, self.COLLISION_DODGED_PIXELS + 1):
                             # 1. Try nudging UP (Useful for stepping onto a ledge automatically)
-                            top_shifted_hitbox = pygame.Rect(round(self.pos[0]), round(self.pos[1]) - i, self.size[0], self.size[1])
-                            if not any(
-                                    top_shifted_hitbox.colliderect(r)
-                                    for
-                                    r in tilemap.physics_rects_around(top_shifted_hitbox, self.GRAVITY_DIRECTION)):
+                            if self.place(probe, 0, -i).collidelist(self.physics_rects(probe)) == -1:
                                 self.pos[1] = self.pos[1] - i
                                 nudged = True
                                 break
                             # 2. Try nudging DOWN (Useful for clearing a ceiling corner)
-                            bottom_shifted_hitbox = pygame.Rect(round(self.pos[0]), round(self.pos[1]) + i, self.size[0], self.size[1])
-                            if not any(
-                                    bottom_shifted_hitbox.colliderect(r)
-                                    for
-                                    r in tilemap.physics_rects_around(bottom_shifted_hitbox, self.GRAVITY_DIRECTION)):
+                            if self.place(probe, 0, i).collidelist(self.physics_rects(probe)) == -1:
                                 self.pos[1] = self.pos[1] + i
                                 nudged = True
                                 break
@@ -211,34 +239,295 @@ class Entity:
                         self.pos[0] = entity_rect.x
                         self._collision_actions(axe)
 
-            for rect in tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION):
-                if ((self.GRAVITY_DIRECTION == 1 and (entity_rect.y - self.size[1] < rect.y <= entity_rect.y or
-                                                      entity_rect.y + self.size[1] > rect.y >= entity_rect.y)) or
-                        (self.GRAVITY_DIRECTION == -1 and (entity_rect.y <= rect.y < entity_rect.y + self.size[1] or
-                                                           entity_rect.y >= rect.y > entity_rect.y + self.size[1]))):
-                    if entity_rect.x - self.size[0] <= rect.x < entity_rect.x:
-                        b_l.add(True)
+            block_left = False
+            block_right = False
+            for rect in self.physics_rects(self.place(probe)):
+                side = self._block_beside(entity_rect, rect)
+                if side == "left":
+                    block_left = True
+                elif side == "right":
+                    block_right = True
+
+            self.get_block_on["left"] = block_left
+            self.get_block_on["right"] = block_right
 
-                    if entity_rect.x + self.size[0] >= rect.x > entity_rect.x:
-                        b_r.add(True)
+    def _reset_collision(self, axe):
+        if axe == "y":
+            if self.velocity[1] > 0 or not self.get_block_on["bottom"]:
+                self.collision["bottom"] = False
+            if self.velocity[1] < 0 or not self.get_block_on["top"]:
+                self.collision["top"] = False
+
+        if axe == "x":
+            if int(self.velocity[0]) > 0 or not self.get_block_on["left"] or self.velocity[0] == 0:
+                self.collision["left"] = False
+            if int(self.velocity[0]) < 0 or not self.get_block_on["right"] or self.velocity[0] == 0:
+                self.collision["right"] = False
 
-            self.get_block_on["left"] = bool(b_l)
-            self.get_block_on["right"] = bool(b_r)
+    def sweep_momentum(self, dt):
+        """Continuous version of apply_momentum: each axis stops at the first block on the way, whatever the speed"""
+        self.sweep_axis("x", self.velocity[0] * dt)
+        self.sweep_axis("y", self.velocity[1] * dt)
 
+    def sweep_axis(self, axe, move):
+        """Moves along one axis, using the time of impact against the collision grid instead of overlap checks"""
+        a = 0 if axe == "x" else 1
+        rect = self.place(self.hitbox)
+        probe = self.probe
+        dist = round(self.pos[a] + move) - rect[a]  # Pixels the (rounded) hitbox travels
+
+        self._reset_collision(axe)
+
+        travel, hit = self.sweep_hit(rect, axe, dist)
+        if axe == "x":
+            travel, hit = self.climb_steps(rect, dist, travel, hit)
+        if hit is not None and self._nudge_condition(hit):
+            # Corner correction as a swept test: a shifted hitbox that gets further than the blocked one is kept
+            for shift in self._nudge_shifts(axe):
+                probe.update(rect)
+                probe.move_ip(shift)
+                if self.sweep_overlaps(probe):
+                    continue
+                shifted_travel, shifted_hit = self.sweep_hit(probe, axe, dist)
+                if abs(shifted_travel) > abs(travel):
+                    self.pos[1 - a] += shift[1 - a]
+                    travel, hit = shifted_travel, shifted_hit
+                    break
+
+        if hit is None:
+            self.pos[a] += move
+        else:
+            self.pos[a] = rect[a] + travel
+            if axe == "x":
+                self.collision["right" if dist > 0 else "left"] = True
+                self._collision_actions(axe)
+            elif (dist > 0) == (self.GRAVITY_DIRECTION == 1):
+                # Landing
+                self.collision["bottom" if self.GRAVITY_DIRECTION == 1 else "top"] = True
+            else:
+                # Head bump
+                self.collision["top" if self.GRAVITY_DIRECTION == 1 else "bottom"] = True
+                self.velocity[1] = 0
+                self._collision_actions(axe)
+
+        entity_rect = self.place(rect)
+        rects = self.physics_rects(entity_rect)
+        if axe == "y":
+            block_under = block_over = False
+            for block in rects:
+                block_under = block_under or self._block_under(entity_rect, block)
+                block_over = block_over or self._block_over(entity_rect, block)
+            self.get_block_on["bottom"] = block_under
+            self.get_block_on["top"] = block_over
+            if self.is_on_floor():
+                self.pos[1] = round(self.pos[1])
+        else:
+            block_left = block_right = False
+            for block in rects:
+                side = self._block_beside(entity_rect, block)
+                block_left = block_left or side == "left"
+                block_right = block_right or side == "right"
+            self.get_block_on["left"] = block_left
+            self.get_block_on["right"] = block_right
+
+    def climb_steps(self, rect, dist, travel, hit):
+        """
+        Slopes: while the block stopping a horizontal sweep of rect is a step low enough, goes up it (rect and pos)
+        and on. Returns the new sweep_hit result.
+        """
+        probe = self.probe
+        while hit is not None:
+            lift = self._step_up(rect, hit) * self.GRAVITY_DIRECTION
+            if not lift:
+                break
+            probe.update(rect)
+            probe.y -= lift
+            if self.sweep_overlaps(probe):
+                break
+            lifted_travel, lifted_hit = self.sweep_hit(probe, "x", dist)
+            if abs(lifted_travel) <= abs(travel):
+                break
+            self.pos[1] -= lift
+            rect.y -= lift
+            travel, hit = lifted_travel, lifted_hit
+        return travel, hit
+
+    def _nudge_shifts(self, axe):
+        """Corner correction offsets, in the order collision_check tries them"""
+        for i in range(1, self.COLLISION_DODGED_PIXELS + 1):
+            if axe == "x":
+                yield 0, -i
+                yield 0, i
+            else:
+                yield i, 0
+                yield -i, 0
+
+    def sweep_hit(self, rect, axe, dist):
+        """
+        How far rect can travel along axe (signed pixels, dist at most) before touching a block, and that block
+        (None if the way is free). Only the tile lines crossed are looked at, so the cost grows with the distance
+        in tiles, not pixels. Blocks the rect already overlaps are ignored.
+        """
+        tilemap = self.tilemap
+        ts = tilemap.tile_size
+        grid = tilemap.collision_grid
+        horizontal = axe == "x"
+        if horizontal:
+            lead = rect.right if dist > 0 else rect.left
+            cross_min, cross_max = rect.top // ts, (rect.bottom - 1) // ts
+            mask = COLLISION_SOLID
+        else:
+            lead = rect.bottom if dist > 0 else rect.top
+            cross_min, cross_max = rect.left // ts, (rect.right - 1) // ts
+            # One-way tiles only stop falls, and only the ones under the hitbox are scanned
+            mask = COLLISION_SOLID | COLLISION_ONE_WAY if dist > 0 and self.GRAVITY_DIRECTION == 1 else COLLISION_SOLID
+        limit = lead + dist
+
+        travel, hit = dist, None
+        if dist > 0:
+            lines = range(-(-lead // ts), (limit - 1) // ts + 1)
+        else:
+            lines = range(lead // ts - 1, limit // ts - 1, -1)
+        # Half blocks and slopes are tested with their rects below, the ones of the line the lead is inside too
+        partial_rects = []
+        if lead % ts:
+            for cross in range(cross_min, cross_max + 1):
+                x, y = (lead // ts, cross) if horizontal else (cross, lead // ts)
+                code = grid.get(x, y)
+                if code & COLLISION_PARTIAL:
+                    partial_rects += tilemap.shape_rects(x, y, code)
+        for line in lines:
+            for cross in range(cross_min, cross_max + 1):
+                x, y = (line, cross) if horizontal else (cross, line)
+                code = grid.get(x, y)
+                if code & mask:
+                    travel = line * ts - lead if dist > 0 else (line + 1) * ts - lead
+                    hit = pygame.Rect(x * ts, y * ts, ts, ts)
+                    break
+                if code & COLLISION_PARTIAL:
+                    partial_rects += tilemap.shape_rects(x, y, code)
+            if hit is not None:
+                break
+
+        # Partial shapes, then the dynamic colliders (sinking groups, doors) in the swept area, not in the grid
+        area = self.sweep_area
+        if horizontal:
+            area.update(min(lead, limit), rect.top, abs(dist), rect.height)
+        else:
+            area.update(rect.left, min(lead, limit), rect.width, abs(dist))
+        for rects in (partial_rects, self.game.dynamic_colliders.rects_in(area)):
+            for block in rects:
+                if horizontal:
+                    if not (block.top < rect.bottom and block.bottom > rect.top):
+                        continue
+                    edge = block.left if dist > 0 else block.right
+                else:
+                    if not (block.left < rect.right and block.right > rect.left):
+                        continue
+                    edge = block.top if dist > 0 else block.bottom
+                if dist > 0 and lead <= edge and edge - lead < travel:
+                    travel, hit = edge - lead, block
+                elif dist < 0 and lead >= edge and edge - lead > travel:
+                    travel, hit = edge - lead, block
+        return travel, hit
+
+    def _step_up(self, entity_rect, rect):
+        """Pixels to go up (gravity wise) to stand on rect, if it is a step of a slope or half block low enough"""
+        ts = self.tilemap.tile_size
+        if rect.size == (ts, ts) or not self.tilemap.collision_grid.get(rect.x // ts, rect.y // ts) & COLLISION_PARTIAL:
+            return 0
+        lift = entity_rect.bottom - rect.top if self.GRAVITY_DIRECTION == 1 else rect.bottom - entity_rect.top
+        return lift if 0 < lift <= ts // SLOPE_STEPS else 0
+
+    def sweep_overlaps(self, rect):
+        """Whether rect is inside a block, one-way tiles excepted"""
+        ts = self.tilemap.tile_size
+        grid = self.tilemap.collision_grid
+        for x in range(rect.left // ts, (rect.right - 1) // ts + 1):
+            for y in range(rect.top // ts, (rect.bottom - 1) // ts + 1):
+                code = grid.get(x, y)
+                if code & COLLISION_SOLID:
+                    return True
+                if code & COLLISION_PARTIAL and rect.collidelist(self.tilemap.shape_rects(x, y, code)) != -1:
+                    return True
+        return bool(self.game.dynamic_colliders.rects_in(rect))
+
+    def _block_under(self, entity_rect, rect):
+        """Whether rect is a block right under the entity's feet (gravity wise)"""
+        return ((self.GRAVITY_DIRECTION == 1 and entity_rect.y + self.size[
+                    1] >= rect.y > entity_rect.y and entity_rect.x + self.size[
+                         0] > rect.x and entity_rect.x < rect.x + rect.width) or
+                        (self.GRAVITY_DIRECTION == -1 and entity_rect.y > rect.y >= entity_rect.y - self.size[
+                            1] and entity_rect.x + self.size[0] > rect.x and entity_rect.x < rect.x + rect.width))
+
+    def _block_over(self, entity_rect, rect):
+        """Whether rect is a block right on the entity's head (gravity wise)"""
+        return ((self.GRAVITY_DIRECTION == 1 and entity_rect.y - self.size[
+                    1] <= rect.y < entity_rect.y and entity_rect.x + self.size[
+                         0] > rect.x and entity_rect.x < rect.x + rect.width) or
+                        (self.GRAVITY_DIRECTION == -1 and entity_rect.y <= rect.y < entity_rect.y + self.size[
+                            1] and entity_rect.x + self.size[0] > rect.x and entity_rect.x < rect.x + rect.width))
+
+    def _block_beside(self, entity_rect, rect):
+        """'left' or 'right' if rect is a block against a side of the entity, None otherwise"""
+        if ((self.GRAVITY_DIRECTION == 1 and (entity_rect.y - self.size[1] < rect.y <= entity_rect.y or
+                                              entity_rect.y + self.size[1] > rect.y >= entity_rect.y)) or
+                (self.GRAVITY_DIRECTION == -1 and (entity_rect.y <= rect.y < entity_rect.y + self.size[1] or
+                                                   entity_rect.y >= rect.y > entity_rect.y + self.size[1]))):
+            if entity_rect.x - self.size[0] <= rect.x < entity_rect.x:
+                return "left"
+
+            if entity_rect.x + self.size[0] >= rect.x > entity_rect.x:
+                return "right"
+        return None
+
+    @property
+    def contacts(self):
+        """
+        Which sides of the hitbox touch a block: {'floor', 'ceiling', 'left', 'right'}, floor and ceiling gravity wise.
+        Each side is decided by the first block the hitbox would overlap one pixel further that way.
+        Computed once per tick, and again only if the hitbox, the tiles, the dynamic colliders or the one-way tiles state
+        change.
+        """
+        rect = self.place(self.contacts_rect)
+        colliders = self.game.dynamic_colliders  # Doors are opened and closed after the player's physics
+        key = (self.game.ticks, rect.x, rect.y, rect.w, rect.h, self.GRAVITY_DIRECTION,
+               self.tilemap.collision_version, id(colliders), colliders.version,
+               self.game.player.collide_with_passable_blocks)
+        if key != self.contacts_key:
+            g = self.GRAVITY_DIRECTION
+            rects = self.physics_rects(rect)
+            state = self.contacts_state
+            if g == 1:
+                state["floor"] = self._touches(rect, rects, 0, 1)
+                state["ceiling"] = self._touches(rect, rects, 0, -1)
+            else:
+                state["floor"] = self._touches(rect, rects, 0, -1)
+                state["ceiling"] = self._touches(rect, rects, 0, 1)
+            state["left"] = self._touches(rect, rects, -1, 0)
+            state["right"] = self._touches(rect, rects, 1, 0)
+            # The key from before the query: physics_rects can switch the one-way tiles on, the next call redoes it
+            self.contacts_key = key
+        return self.contacts_state
+
+    @staticmethod
+    def _touches(rect, rects, dx, dy):
+        """Whether the first of rects that rect overlaps once moved by dx, dy (one pixel) is right against rect"""
+        rect.move_ip(dx, dy)
+        index = rect.collidelist(rects)
+        rect.move_ip(-dx, -dy)
+        if index == -1:
+            return False
+        block = rects[index]
+        if dx:
+            return rect.left == block.right if dx < 0 else rect.right == block.left
+        return rect.top == block.bottom if dy < 0 else rect.bottom == block.top
 
     def is_on_floor(self):
         """Uses tilemap to heck if the player is standing on a surface based on gravity direction. used for gravity, jump, etc."""
-        # Offset depends on gravity: +1 if normal (down), -1 if inverted (up)
-        y_offset = self.GRAVITY_DIRECTION
-
-        for rect in self.tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION):
-            entity_rect = pygame.Rect(round(self.pos[0]), round(self.pos[1]) + y_offset, self.size[0], self.size[1])
-            if entity_rect.colliderect(rect):
-                if self.GRAVITY_DIRECTION == 1:
-                    return self.rect.bottom == rect.top and self.velocity[1] >= 0
-                else:
-                    return self.rect.top == rect.bottom and self.velocity[1] <= 0
-        return False
+        if self.GRAVITY_DIRECTION == 1:
+            return self.contacts["floor"] and self.velocity[1] >= 0
+        return self.contacts["floor"] and self.velocity[1] <= 0
 
     def gravity(self, dt):
         """Handles gravity. Gives downwards momentum (capped at 6) if in the air, negates momentum if on the ground.
@@ -267,6 +556,12 @@ class Player(Entity):
     WALLJUMP_PUSHAWAY_TIME = 10
     DASH_COOLDOWN = 18
     DASH_STARTUP_FRAMES = 3
+    SPIN_SPEED = 4.5  # Degrees per frame in the air
+
+    # collide_with masks, shared by every player: (width, height, angle in SPIN_SPEED steps) -> rotated hitbox mask,
+    # (width, height) -> filled mask
+    ROTATED_HITBOX_MASKS = {}
+    TARGET_MASKS = {}
 
     def __init__(self, game, tilemap, pos, size):
         super().__init__(game, tilemap, pos, size)
@@ -408,7 +703,7 @@ class Player(Entity):
 
         if self.is_stunned:
             # Calculate time since stun started
-            stun_elapsed = time.time() - self.last_stun_time
+            stun_elapsed = self.game.sim_time - self.last_stun_time
             stun_duration = 0.2
 
             if stun_elapsed < stun_duration:
@@ -455,7 +750,7 @@ class Player(Entity):
             self.superjump = False
 
 
-        rotation_speed = 4.5
+        rotation_speed = self.SPIN_SPEED
         if not self.is_on_floor() and not self.can_walljump["sliding"] and self.air_time > 2:
             # Spin speed (Adjust "8" to make it faster/slower
             # Spin based on direction (Clockwise if facing right, CCW if left)
@@ -943,8 +1238,8 @@ class Player(Entity):
 
     @override
     def _nudge_condition(self, rect):
-        return rect not in self.game.doors_rects and self.dashtime_cur and (
-                self.dash_direction[0] == 0 or self.dash_direction[1] == 0)
+        return self.dashtime_cur and (self.dash_direction[0] == 0 or self.dash_direction[1] == 0) and (
+                not self.game.dynamic_colliders.is_kind(rect, "door"))
     @override
     def _collision_actions(self, axe):
         #Left and Right collision
@@ -1089,19 +1384,7 @@ class Player(Entity):
             block_top    = None
             block_bottom = None
             for tile_row in range(player_tile_top, player_tile_bottom + 1):
-                loc = f"{wall_tile_x};{tile_row}"
-                is_solid = False
-                for layer in self.tilemap.tilemap:
-                    if loc in self.tilemap.tilemap[layer]:
-                        tile_id = self.tilemap.tile_manager.unpack_tile(
-                            self.tilemap.tilemap[layer][loc]
-                        )[0]
-                        tile_type = self.tilemap.tile_manager.tiles[tile_id].type
-                        from scripts.tilemap import PHYSICS_TILES
-                        if tile_type in PHYSICS_TILES:
-                            is_solid = True
-                            break
-                if is_solid:
+                if self.tilemap.collision_grid.get(wall_tile_x, tile_row) & COLLISION_SOLID:
                     tile_top    = tile_row * ts
                     tile_bottom = tile_top + ts
                     if block_top    is None or tile_top    < block_top:    block_top    = tile_top
@@ -1190,35 +1473,45 @@ class Player(Entity):
 
         # --- TRUE ROTATED HITBOX VIA PYGAME MASKS ---
 
-        # 1. Create a solid surface representing the player's exact base hitbox
-        hitbox_surf = pygame.Surface(self.size, pygame.SRCALPHA)
-        hitbox_surf.fill((255, 255, 255, 255))
-
-        # 2. Rotate that surface by the player's angle
-        rotated_surf = pygame.transform.rotate(hitbox_surf, self.rotation_angle)
+        # 1. The player's hitbox rotated by its angle, and a completely filled mask for the target 'rect'
+        player_mask = self.rotated_hitbox_mask()
+        target_mask = self.TARGET_MASKS.get(rect.size)
+        if target_mask is None:
+            target_mask = self.TARGET_MASKS[rect.size] = pygame.Mask(rect.size, fill=True)
 
-        # 3. Generate a precise mask from the rotated surface
-        player_mask = pygame.mask.from_surface(rotated_surf)
+        # 2. Anchor the rotated mask on the hitbox center (like Surface.get_rect(center=...))
+        width, height = player_mask.get_size()
+        offset_x = rect.x - (base_rect.centerx - width // 2)
+        offset_y = rect.y - (base_rect.centery - height // 2)
 
-        # 4. Get the new rect of the rotated surface so we can properly anchor it
-        rotated_rect = rotated_surf.get_rect(center=base_rect.center)
-
-        # 5. Create a simple, completely filled mask for the target 'rect'
-        target_mask = pygame.Mask(rect.size, fill=True)
-
-        # 6. Calculate the relative coordinate offset between the two masks
-        offset_x = rect.x - rotated_rect.x
-        offset_y = rect.y - rotated_rect.y
-
-        # 7. Return True if any "1" pixels overlap in the two masks
+        # 3. Return True if any "1" pixels overlap in the two masks
         if not static_rect:
-            return player_mask.overlap(target_mask, (int(offset_x), int(offset_y))) is not None
+            return player_mask.overlap(target_mask, (offset_x, offset_y)) is not None
         else:
-            return ((player_mask.overlap(target_mask, (int(offset_x), int(offset_y))) is not None)
-                    and self.rect.colliderect(rect))
+            return (player_mask.overlap(target_mask, (offset_x, offset_y)) is not None
+                    and base_rect.colliderect(rect))
+
+    def rotated_hitbox_mask(self):
+        """Mask of the hitbox turned by rotation_angle (rounded to a SPIN_SPEED step), built once per angle and size"""
+        steps = round(self.rotation_angle / self.SPIN_SPEED) % round(360 / self.SPIN_SPEED)
+        key = (self.size[0], self.size[1], steps)
+        mask = self.ROTATED_HITBOX_MASKS.get(key)
+        if mask is None:
+            hitbox_surf = pygame.Surface(self.size, pygame.SRCALPHA)
+            hitbox_surf.fill((255, 255, 255, 255))
+            rotated_surf = pygame.transform.rotate(hitbox_surf, steps * self.SPIN_SPEED)
+            mask = self.ROTATED_HITBOX_MASKS[key] = pygame.mask.from_surface(rotated_surf)
+        return mask
+
+    def update_walljump_fatigue(self):
+        """Blinking of the grey look on the last walljumps (see render), counted in ticks"""
+        if self.max_walljumps - self.can_walljump['count'] <= 1:
+            if self.walljump_fatigue_frame_count > (30 if self.can_walljump['count'] == self.max_walljumps - 1 else 10):
+                self.walljump_fatigue_frame_count = 0
+            self.walljump_fatigue_frame_count += 1
 
     def render(self, surf, offset=(0, 0)):
-        pos = [round(self.pos[0]), round(self.pos[1])]
+        pos = self.render_pos()
         # 1. Draw Ghosts
         for ghost in self.ghost_images[:]:
             alpha = int(255 * (ghost["lifetime"] / 20) ** 2)
@@ -1273,15 +1566,12 @@ class Player(Entity):
             scaled_img.blit(color_mask, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
 
         if self.max_walljumps - self.can_walljump['count'] <= 1:
-            self.walljump_fatigue_frame_count += 1
             removal_factor = 255
             color = (80, removal_factor, removal_factor, 0)
             color_mask.fill(color)
             if self.walljump_fatigue_frame_count > (25 if self.can_walljump['count'] == self.max_walljumps - 1 else 5):
                 scaled_img = pygame.transform.grayscale(scaled_img)
                 scaled_img.blit(color_mask, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
-            if self.walljump_fatigue_frame_count > (30 if self.can_walljump['count'] == self.max_walljumps - 1 else 10):
-                self.walljump_fatigue_frame_count = 0
 
         if self.rotation_angle != 0:
             final_img = pygame.transform.rotate(scaled_img, self.rotation_angle)
@@ -1293,7 +1583,9 @@ class Player(Entity):
             blit_rect = pygame.Rect(render_x, render_y, final_img.get_width(), final_img.get_height())
 
         # --- TILE CLIPPING (always applied) ---
-        solid_rects = self.game.tilemap.physics_rects_around(self.rect, self.GRAVITY_DIRECTION)
+        # Solid tiles as a few merged rects, one-way tiles, sinking groups and doors as they are
+        solid_rects = (self.tilemap.solid_rects_in(*self.tilemap.neighbor_bounds(self.rect, self.GRAVITY_DIRECTION)) +
+                       self.physics_rects(self.rect, include_solid=False))
         if solid_rects:
             keep_mask = pygame.Surface(final_img.get_size(), pygame.SRCALPHA)
             keep_mask.fill((255, 255, 255, 255))
@@ -1309,11 +1601,8 @@ class Player(Entity):
         if self.show_hitbox:
             base_rect = self.rect
             if self.rotation_angle % 360 != 0:
-                hitbox_surf = pygame.Surface(self.size, pygame.SRCALPHA)
-                hitbox_surf.fill((255, 255, 255, 255))
-                rotated_surf = pygame.transform.rotate(hitbox_surf, self.rotation_angle)
-                player_mask = pygame.mask.from_surface(rotated_surf)
-                rotated_rect = rotated_surf.get_rect(center=base_rect.center)
+                player_mask = self.rotated_hitbox_mask()
+                rotated_rect = player_mask.get_rect(center=base_rect.center)
                 outline = player_mask.outline()
                 shifted_outline = [
                     (p[0] + rotated_rect.x - offset[0], p[1] + rotated_rect.y - offset[1])
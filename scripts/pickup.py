@@ -1,5 +1,4 @@
 import pygame
-import time
 
 class Pickup:
 
@@ -69,13 +68,13 @@ class Pickup:
                 self.animation.done = False
                 self.animation.frame = 0
                 self.state = "taken"
-                self.taking_time = time.time()
+                self.taking_time = self.game.sim_time
                 self.animation = self.game.assets[self.type + "/" + self.state].copy()
 
         elif self.state == "taken":
             if "taken" in self.animations_duration[self.type]:
                 self.animation.img_duration = self.animations_duration[self.type][self.state]
-                if time.time() - self.taking_time >= self.recharging_time:
+                if self.game.sim_time - self.taking_time >= self.recharging_time:
                     self.state = "appearing"
                     self.animation = self.game.assets[self.type + "/" + self.state].copy()
             else:
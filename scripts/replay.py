@@ -0,0 +1,110 @@
+import struct
+import sys
+import time
+import zlib
+
+# One bit per key, a tick of input is a single byte
+REPLAY_KEYS = ("key_right", "key_left", "key_up", "key_down", "key_jump", "key_dash", "key_noclip")
+INTERACT_BIT = 1 << 7  # key_interact is an event (handled between ticks), not a dict_kb state
+
+DEFAULT_REPLAY_PATH = "replays/replay.anrp"
+
+REPLAY_MAGIC = b"ANRP"
+REPLAY_VERSION = 2
+# magic, version, seed, level id, player pos x/y, tick count
+HEADER = struct.Struct("<4sBQHddI")
+
+
+def pack_inputs(dict_kb):
+    mask = 0
+    for bit, key in enumerate(REPLAY_KEYS):
+        if dict_kb.get(key):
+            mask |= 1 << bit
+    return mask
+
+
+def unpack_inputs(mask):
+    return {key: (mask >> bit) & 1 for bit, key in enumerate(REPLAY_KEYS)}
+
+
+class InputRecorder:
+    """
+    Records Game.dict_kb every simulation tick, with the RNG seed, the level and the player position at the start.
+    Recordings always start from Game.restart_level (the level reloaded, a new player where the old one was) and a
+    reseeded RNG, a state a replay can rebuild exactly from the header.
+    """
+
+    def __init__(self, game, path, seed=None):
+        self.game = game
+        self.path = path
+        self.level_id = game.level_id
+        self.start_pos = tuple(game.player.pos)
+        game.restart_level(self.level_id, self.start_pos)
+        self.seed = game.seed_rng(seed)
+        self.ticks = bytearray()
+        self.interact = False
+
+    def record_interact(self):
+        self.interact = True
+
+    def record(self, dict_kb):
+        mask = pack_inputs(dict_kb)
+        if self.interact:
+            mask |= INTERACT_BIT
+            self.interact = False
+        self.ticks.append(mask)
+
+    def save(self):
+        with open(self.path, "wb") as f:
+            f.write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.level_id, *self.start_pos,
+                                len(self.ticks)))
+            f.write(zlib.compress(bytes(self.ticks), 9))
+
+
+class Replay:
+    def __init__(self, seed, level_id, start_pos, ticks):
+        self.seed = seed
+        self.level_id = level_id
+        self.start_pos = start_pos
+        self.ticks = ticks
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, seed, level_id, x, y, count = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a replay file (version {REPLAY_VERSION})")
+        ticks = zlib.decompress(data[HEADER.size:])
+        if len(ticks) != count:
+            raise ValueError(f"{path} is truncated: {len(ticks)} ticks out of {count}")
+        return cls(seed, level_id, (x, y), ticks)
+
+    def start(self, game):
+        """Puts a (headless) game back in the recorded starting state, like InputRecorder did"""
+        game.restart_level(self.level_id, self.start_pos)
+        game.state = game.PLAYING_STATE
+        game.seed_rng(self.seed)
+
+    def play(self, game, on_tick=None):
+        """Runs every recorded tick through game.step. on_tick(game, tick) is called after each one"""
+        self.start(game)
+        for tick, mask in enumerate(self.ticks):
+            if mask & INTERACT_BIT:
+                game.interact()
+            game.step(unpack_inputs(mask))
+            if on_tick is not None:
+                on_tick(game, tick)
+
+
+if __name__ == "__main__":
+    # python -m scripts.replay <file>: replays a recording headless, as fast as possible
+    from scripts.game import Game
+
+    replay = Replay.load(sys.argv[1])
+    game = Game(headless=True)
+    start = time.perf_counter()
+    replay.play(game)
+    elapsed = time.perf_counter() - start
+    print(f"{len(replay.ticks)} ticks in {elapsed:.2f}s ({len(replay.ticks) / elapsed:.0f} ticks/s), "
+          f"player at {game.player.pos}")
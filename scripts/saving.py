@@ -272,6 +272,7 @@ class Save:
                 "fullscreen": self.game.fullscreen,
                 "v-sync": self.game.vsync_on,
                 "brightness": self.game.brightness,
+                "lighting_resolution": self.game.lighting_resolution,
                 "debug_mode": self.game.debug_mode,
             }
 
@@ -312,6 +313,7 @@ class Save:
             self.game.fullscreen = save_data.get("fullscreen", True)
             self.game.vsync_on = save_data.get("vsync_on", True)
             self.game.brightness = save_data.get("brightness", 0.5)
+            self.game.lighting_resolution = save_data.get("lighting_resolution", 1)
             self.game.debug_mode = save_data.get("debug_mode", False)
             self.game.set_keymap(self.load_bindings())
             for key,bind in self.game.key_map.items():
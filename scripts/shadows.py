@@ -0,0 +1,148 @@
+"""
+Shadow casting for the lights: the solid cells of the collision grid become merged edges (cached per chunk), and
+every shadow casting light gets the visibility polygon of its area against them (cached per light).
+Both caches compare CollisionGrid chunk versions, so a light costs nothing again until a tile near it changes.
+"""
+import math
+
+from scripts.tile_chunks import CHUNK_SIZE, CHUNK_SHIFT, COLLISION_SOLID
+
+RAY_EPSILON = 0.0001  # radians, the rays passing just beside every corner
+
+
+def chunk_edges(grid, chunk_pos, tile_size):
+    """
+    Edges between the solid and the free cells of a chunk, consecutive ones merged into one segment.
+    Edge: (x1, y1, x2, y2, normal_x, normal_y) in pixels, the normal pointing out of the solid cells.
+    """
+    base_x, base_y = chunk_pos[0] << CHUNK_SHIFT, chunk_pos[1] << CHUNK_SHIFT
+    # Solid flags of the chunk plus a one cell border, the edges on the chunk sides depend on the neighbors
+    size = CHUNK_SIZE + 2
+    solid = [[bool(grid.get(base_x + x - 1, base_y + y - 1) & COLLISION_SOLID) for x in range(size)]
+             for y in range(size)]
+
+    edges = []
+    for y in range(1, size - 1):
+        for normal_y in (-1, 1):
+            start = None
+            for x in range(1, size):
+                free_side = x < size - 1 and solid[y][x] and not solid[y + normal_y][x]
+                if free_side and start is None:
+                    start = x
+                elif not free_side and start is not None:
+                    edge_y = (base_y + y - 1 + (normal_y > 0)) * tile_size
+                    edges.append(((base_x + start - 1) * tile_size, edge_y, (base_x + x - 1) * tile_size, edge_y,
+                                  0, normal_y))
+                    start = None
+    for x in range(1, size - 1):
+        for normal_x in (-1, 1):
+            start = None
+            for y in range(1, size):
+                free_side = y < size - 1 and solid[y][x] and not solid[y][x + normal_x]
+                if free_side and start is None:
+                    start = y
+                elif not free_side and start is not None:
+                    edge_x = (base_x + x - 1 + (normal_x > 0)) * tile_size
+                    edges.append((edge_x, (base_y + start - 1) * tile_size, edge_x, (base_y + y - 1) * tile_size,
+                                  normal_x, 0))
+                    start = None
+    return edges
+
+
+def visibility_polygon(center, radius, edges):
+    """
+    Points (world pixels, sorted by angle) of the area a light at center sees inside its 2 * radius square.
+    Only the edges facing the light block it, so a light inside a wall still shines out of it.
+    """
+    cx, cy = center
+    x_min, y_min, x_max, y_max = cx - radius, cy - radius, cx + radius, cy + radius
+    segments = [(x_min, y_min, x_max, y_min), (x_max, y_min, x_max, y_max),
+                (x_max, y_max, x_min, y_max), (x_min, y_max, x_min, y_min)]
+    for x1, y1, x2, y2, normal_x, normal_y in edges:
+        if normal_x * (cx - x1) + normal_y * (cy - y1) <= 0:
+            continue
+        if max(x1, x2) < x_min or min(x1, x2) > x_max or max(y1, y2) < y_min or min(y1, y2) > y_max:
+            continue
+        segments.append((x1, y1, x2, y2))
+
+    angles = set()
+    for x1, y1, x2, y2 in segments:
+        for px, py in ((x1, y1), (x2, y2)):
+            angle = math.atan2(py - cy, px - cx)
+            angles.update((angle - RAY_EPSILON, angle, angle + RAY_EPSILON))
+
+    polygon = []
+    for angle in sorted(angles):
+        dx, dy = math.cos(angle), math.sin(angle)
+        nearest = math.inf
+        for x1, y1, x2, y2 in segments:
+            sx, sy = x2 - x1, y2 - y1
+            denominator = dx * sy - dy * sx
+            if -1e-12 < denominator < 1e-12:
+                continue  # Parallel
+            ox, oy = x1 - cx, y1 - cy
+            t = (ox * sy - oy * sx) / denominator
+            u = (ox * dy - oy * dx) / denominator
+            if 0 < t < nearest and 0 <= u <= 1:
+                nearest = t
+        if nearest != math.inf:
+            polygon.append((cx + dx * nearest, cy + dy * nearest))
+    return polygon
+
+
+class ShadowCaster:
+    def __init__(self, game):
+        self.game = game
+        self.grid = None  # Collision grid the caches were built from
+        self.edges = {}  # chunk pos -> (versions, edges)
+        self.polygons = {}  # light key -> (center, radius, versions, polygon)
+
+    @property
+    def tilemap(self):
+        """The game's tilemap of the moment, the editor and its play test swap it"""
+        return self.game.tilemap
+
+    def current_grid(self):
+        """Collision grid of the current tilemap, the caches start over when it isn't the one they were built from"""
+        grid = self.tilemap.collision_grid
+        if grid is not self.grid:
+            self.grid = grid
+            self.edges = {}
+            self.polygons = {}
+        return grid
+
+    def forget(self, key):
+        self.polygons.pop(key, None)
+
+    def forget_all(self):
+        self.polygons = {}
+
+    def region_chunks(self, center, radius):
+        chunk_pixels = CHUNK_SIZE * self.tilemap.tile_size
+        x_min, y_min = int(center[0] - radius) // chunk_pixels, int(center[1] - radius) // chunk_pixels
+        x_max, y_max = int(center[0] + radius) // chunk_pixels, int(center[1] + radius) // chunk_pixels
+        return [(cx, cy) for cx in range(x_min, x_max + 1) for cy in range(y_min, y_max + 1)]
+
+    def edges_of(self, chunk_pos):
+        grid = self.current_grid()
+        cx, cy = chunk_pos
+        versions = tuple(grid.chunk_version(pos) for pos in
+                         ((cx, cy), (cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)))
+        cached = self.edges.get(chunk_pos)
+        if cached is None or cached[0] != versions:
+            cached = self.edges[chunk_pos] = (versions, chunk_edges(grid, chunk_pos, self.tilemap.tile_size))
+        return cached[1]
+
+    def polygon(self, key, center, radius):
+        """Visibility polygon of the light, the same list object as long as it is still valid"""
+        center = (center[0], center[1])
+        grid = self.current_grid()
+        chunks = self.region_chunks(center, radius)
+        # Chunk edges also depend on their neighbors
+        versions = tuple(grid.chunk_version((cx + dx, cy + dy)) for cx, cy in chunks
+                         for dx, dy in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)))
+        cached = self.polygons.get(key)
+        if cached is None or cached[0] != center or cached[1] != radius or cached[2] != versions:
+            edges = [edge for chunk_pos in chunks for edge in self.edges_of(chunk_pos)]
+            cached = self.polygons[key] = (center, radius, versions, visibility_polygon(center, radius, edges))
+        return cached[3]
@@ -1,74 +1,106 @@
 import pygame
 
+from scripts.utils import lerp_pos
 
 class SinkingGroup:
+    """
+    Tiles sinking together while the player stands on them, moved as one rigid body: the tiles are placed once
+    relative to the group's top left corner, only the group's y changes.
+    """
     DOWN_SPEED = 0.2 #pixels per frame
     UP_SPEED = 0.4
     BOTTOM_LIMIT = 8 #pixels under initial position
 
     def __init__(self, game_instance, group):
         self.game = game_instance
-        self.group = {}
+        ts = self.tile_size = game_instance.tile_size
+
+        cells = {tile_loc: tuple(int(float(val)) for val in tile_loc.split(";")) for tile_loc in group}
+        self.cell_x = min(x for x, _ in cells.values())
+        self.cell_y = min(y for _, y in cells.values())
+        width = max(x for x, _ in cells.values()) - self.cell_x + 1
+        height = max(y for _, y in cells.values()) - self.cell_y + 1
+
+        self.rest_y = self.cell_y * ts
+        self.y = float(self.rest_y)  # Top of the group, the only thing that moves
+        self.prev_y = self.y
+        self.bbox = pygame.Rect(self.cell_x * ts, self.rest_y, width * ts, height * ts)
+
+        self.mask = set()  # (dx, dy) of the colliding cells, from the top left one
+        self.cell_rects = {}  # (dx, dy) -> Rect of the cell, moved with the group when asked for (see rects_in)
+        self.rects_y = self.bbox.y
+        self.images = []  # (img, dx, dy) in pixels from the top left corner
+        self.objects = []  # (tile, y from the group's top) of the tiles that aren't ids: drawn, moved, not colliding
         for tile_loc in group:
             tile = group[tile_loc][0]
-            layer = group[tile_loc][1]
+            dx, dy = cells[tile_loc][0] - self.cell_x, cells[tile_loc][1] - self.cell_y
             if type(tile) != int:
-                self.group[tile_loc] = {"tile": tile, "pos": tile.pos, "img": tile.image, "layer": layer}
+                self.images.append((tile.image, tile.pos[0] - self.bbox.x, tile.pos[1] - self.rest_y))
+                self.objects.append((tile, tile.pos[1] - self.rest_y))
                 continue
-            pos = [float(val)*game_instance.tile_size for val in tile_loc.split(";")]
-            tile_id, variant, rotation, flip_x, flip_y = self.game.tilemap.tile_manager.unpack_tile(tile)
-            img = self.game.tilemap.tile_manager.tiles[tile_id].images[variant]
-            img = pygame.transform.rotate(img, rotation * -90)
-            img = pygame.transform.flip(img, flip_x, flip_y)
-            self.group[tile_loc] = {"tile": tile, "pos": pos, "img": img, "layer": layer}
-
-            rect = pygame.Rect(int(pos[0]), int(pos[1]), self.game.tile_size, self.game.tile_size)
-            self.game.sinking_rects.append(rect)
+            self.images.append((self.game.tilemap.tile_manager.get_transformed_img(tile), dx * ts, dy * ts))
+            self.mask.add((dx, dy))
+            self.cell_rects[(dx, dy)] = pygame.Rect(self.bbox.x + dx * ts, self.bbox.y + dy * ts, ts, ts)
 
+        self.probe = pygame.Rect(0, 0, 0, 0)
+        self.game.dynamic_colliders.add(self, "sinking")
         self.down_speed_cur = 0
         self.up_speed_cur = 0
 
+    def move_to(self, y):
+        self.y = y
+        if self.bbox.y != int(y):
+            self.bbox.y = int(y)
+            self.game.dynamic_colliders.move(self)
+        for tile, dy in self.objects:
+            tile.pos[1] = y + dy
+
+    def cells_in(self, area):
+        """(dx, dy) of the colliding cells overlapping area: the bounding box first, then only the cells under area"""
+        bbox = self.bbox
+        if not bbox.colliderect(area):
+            return []
+        ts = self.tile_size
+        x_min = (max(area.left, bbox.left) - bbox.left) // ts
+        x_max = (min(area.right, bbox.right) - 1 - bbox.left) // ts
+        y_min = (max(area.top, bbox.top) - bbox.top) // ts
+        y_max = (min(area.bottom, bbox.bottom) - 1 - bbox.top) // ts
+        mask = self.mask
+        return [(dx, dy) for dx in range(x_min, x_max + 1) for dy in range(y_min, y_max + 1) if (dx, dy) in mask]
+
+    def rects_in(self, area):
+        """Rects of the colliding cells overlapping area. They are the group's own: don't change them"""
+        cells = self.cells_in(area)
+        if cells and self.rects_y != self.bbox.y:
+            self.rects_y = top = self.bbox.y
+            for (dx, dy), rect in self.cell_rects.items():
+                rect.y = top + dy * self.tile_size
+        return [self.cell_rects[cell] for cell in cells]
+
+    def player_on_top(self):
+        """Whether the player touches the group moved up a pixel (like a rect per tile, but one box test first)"""
+        probe = self.probe
+        probe.update(self.game.player.rect)
+        probe.y += 1
+        return bool(self.cells_in(probe))
 
     def update(self, dt):
-        no_more_collision = True
-        for tile_loc in self.group:
-            tile = self.group[tile_loc]
-            tile_pos = tile["pos"]
-            tile_type = type(tile["tile"])
-            shifted_rect = pygame.Rect(int(tile_pos[0]), int(tile_pos[1] - 1), self.game.tile_size, self.game.tile_size)
+        self.prev_y = self.y
 
-            if tile_type != int:
-                continue
-            if self.game.player.collide_with(shifted_rect, static_rect=True, rotating_rect=False):
-                self.game.sinking_colliding_group = self
-                no_more_collision = False
-                break
+        no_more_collision = True
+        if self.player_on_top():
+            self.game.sinking_colliding_group = self
+            no_more_collision = False
 
         if self.game.sinking_colliding_group == self:
-            total_delta = 0
             if self.down_speed_cur == 0:
-                for tile_loc in self.group:
-                    tile = self.group[tile_loc]
-                    tile_pos = tile["pos"]
-                    tile_type = type(tile["tile"])
-                    initial_y = [float(val) * self.game.tile_size for val in tile_loc.split(";")][1]
-
-                    old_y = tile["pos"][1]
-                    new_y = min(tile["pos"][1] + 1, initial_y + self.BOTTOM_LIMIT)
-                    delta = new_y - old_y
-                    total_delta = delta  # same for all tiles in the group
-
-                    if tile_type == int:
-                        rect = pygame.Rect(int(tile_pos[0]), int(tile_pos[1]), self.game.tile_size, self.game.tile_size)
-                        self.game.sinking_rects.remove(rect)
-                    tile["pos"][1] = new_y
-                    if tile_type == int:
-                        rect = pygame.Rect(int(tile["pos"][0]), int(tile["pos"][1]), self.game.tile_size, self.game.tile_size)
-                        self.game.sinking_rects.append(rect)
+                new_y = min(self.y + 1, self.rest_y + self.BOTTOM_LIMIT)
+                delta = new_y - self.y
+                self.move_to(new_y)
                 self.down_speed_cur = 1 / self.DOWN_SPEED
 
                 # Push the player down with the block so there's no gap
-                if total_delta > 0:
+                if delta > 0:
                     self.game.player.pos[1] += 1
 
             self.down_speed_cur = max(0, self.down_speed_cur - dt)
@@ -78,29 +110,13 @@ class SinkingGroup:
 
         if no_more_collision:
             if self.up_speed_cur == 0:
-                for tile_loc in self.group:
-                    tile = self.group[tile_loc]
-                    tile_pos = tile["pos"]
-                    tile_type = type(tile["tile"])
-
-                    initial_y = [float(val) * self.game.tile_size for val in tile_loc.split(";")][1]
-
-                    if tile_type == int:
-                        rect = pygame.Rect(int(tile_pos[0]), int(tile_pos[1]), self.game.tile_size, self.game.tile_size)
-                        self.game.sinking_rects.remove(rect)
-                    tile["pos"][1] = max(tile["pos"][1] - self.UP_SPEED, initial_y)
-                    if tile_type == int:
-                        rect = pygame.Rect(int(tile["pos"][0]), int(tile["pos"][1]), self.game.tile_size,
-                                           self.game.tile_size)
-                        self.game.sinking_rects.append(rect)
+                self.move_to(max(self.y - self.UP_SPEED, self.rest_y))
                 self.up_speed_cur = 1 / self.UP_SPEED
 
             self.up_speed_cur = max(0, self.up_speed_cur - dt)
 
     def render(self, surf, offset=(0, 0)):
-        for tile_loc in self.group:
-            pos = self.group[tile_loc]["pos"]
-            img = self.group[tile_loc]["img"]
-            #rect = pygame.Rect(pos[0] - offset[0], pos[1] - offset[1], self.game.tile_size, self.game.tile_size)
-            #pygame.draw.rect(surf, (255, 255, 255), rect)
-            surf.blit(img, (round(pos[0]) - offset[0], round(pos[1]) - offset[1]))
\ No newline at end of file
+        x, y = lerp_pos((self.bbox.x, self.prev_y), (self.bbox.x, self.y), self.game.render_alpha)
+        x, y = x - offset[0], y - offset[1]
+        for img, dx, dy in self.images:
+            surf.blit(img, (x + dx, y + dy))
@@ -1,16 +1,22 @@
 import json
 import os
 
+import pygame
+
 from scripts.utils import load_tiles, Animation
+from scripts.tile_chunks import COLLISION_EMPTY, COLLISION_SOLID, COLLISION_ONE_WAY, transform_shape
 
 
 class TileManager:
 
-    PHYSICS_TILES = {'whiter_blocks', 'white_blocks', 'purpur_rock', 'vine', 'mossy_stone', 'gray_mossy_stone',
-                     'mossy_stone_gluy'}
-
-    PASSABLE_TILES = {'vine_transp': [0, 1, 2], 'vine_transp_back': [0, 1, 2], 'dark_vine': [0, 1, 2],
-                         'hanging_vine': [0, 1, 2]}
+    # Collision shape (tile_chunks COLLISION_* code) of the tiles that collide: one code for every variant, or a
+    # list with one code per variant (the missing ones don't collide)
+    TILE_SHAPES = {'whiter_blocks': COLLISION_SOLID, 'white_blocks': COLLISION_SOLID, 'purpur_rock': COLLISION_SOLID,
+                   'vine': COLLISION_SOLID, 'mossy_stone': COLLISION_SOLID, 'gray_mossy_stone': COLLISION_SOLID,
+                   'mossy_stone_gluy': COLLISION_SOLID,
+                   'vine_transp': [COLLISION_ONE_WAY] * 3, 'vine_transp_back': [COLLISION_ONE_WAY] * 3,
+                   'dark_vine': [COLLISION_ONE_WAY] * 3, 'hanging_vine': [COLLISION_ONE_WAY] * 3}
+    VARIANT_COUNT = 16  # 4 bits in a packed tile
 
     ID_MASK = 0xFFFF
     VAR_OFFSET = 16
@@ -23,22 +29,44 @@ class TileManager:
         self.registry = self.load_registry()
         self.tiles_images = load_tiles()
         self.sync_folder()
-        self.tiles = {}
-        for tile_type in self.tiles_images:
-            t_id = self.get_id(tile_type)
-            images = self.tiles_images[tile_type]
-            solid = tile_type in self.PHYSICS_TILES
-            passable = tile_type in self.PASSABLE_TILES
-            self.tiles[t_id] = Tile(tile_type, images, solid, passable)
+        self.reload_tiles()
 
     def reload_tiles(self):
         self.tiles = {}
+        self.shape_table = {}  # tile id -> shape code of each variant
+        self.transformed_images = {}
         for tile_type in self.tiles_images:
             t_id = self.get_id(tile_type)
             images = self.tiles_images[tile_type]
-            solid = tile_type in self.PHYSICS_TILES
-            passable = tile_type in self.PASSABLE_TILES
+            shapes = self.compile_shapes(tile_type)
+            self.shape_table[t_id] = shapes
+            solid = shapes[0] == COLLISION_SOLID
+            passable = COLLISION_ONE_WAY in shapes
             self.tiles[t_id] = Tile(tile_type, images, solid, passable)
+        # Longest side of any tile image (rotations swap the sides), how far a tile can draw from its own cell
+        self.max_image_size = max((max(img.get_size()) for tile in self.tiles.values()
+                                   for img in self.all_images(tile.images)), default=0)
+
+    @staticmethod
+    def all_images(images):
+        """Every image of a tile: its variants, or every frame of every state of an animated tile"""
+        if isinstance(images, Animation):
+            return [img for frames in images.images.values() for img in frames]
+        return images
+
+    def compile_shapes(self, tile_type):
+        shape = self.TILE_SHAPES.get(tile_type, COLLISION_EMPTY)
+        if isinstance(shape, int):
+            return bytes([shape] * self.VARIANT_COUNT)
+        return bytes(shape[:self.VARIANT_COUNT]).ljust(self.VARIANT_COUNT, bytes([COLLISION_EMPTY]))
+
+    def get_shape(self, value):
+        """Collision shape code of a packed tile, its rotation and flips applied"""
+        tile_id, variant, rotation, flip_h, flip_v = self.unpack_tile(value)
+        shapes = self.shape_table.get(tile_id)
+        if shapes is None:
+            return COLLISION_EMPTY
+        return transform_shape(shapes[variant], rotation, flip_h, flip_v)
 
     def load_registry(self):
         if os.path.exists(self.manifest_path):
@@ -73,6 +101,19 @@ class TileManager:
             img = images[variant].copy()
         return img
 
+    def get_transformed_img(self, value):
+        """Ready to blit image of a packed tile (variant, rotation and flips applied), built once per packed value.
+        The surface is shared: copy it before drawing on it."""
+        img = self.transformed_images.get(value)
+        if img is None:
+            tile_id, variant, rotation, flip_h, flip_v = self.unpack_tile(value)
+            img = self.get_tile_img(tile_id, variant)
+            img = pygame.transform.rotate(img, rotation * -90)
+            img = pygame.transform.flip(img, flip_h, flip_v)
+            img = img.convert_alpha()
+            self.transformed_images[value] = img
+        return img
+
     def pack_tile(self, tile_id, variant, rotation=0, flip_h=False, flip_v=False):
         """Combine les propriétés dans un seul entier."""
 
@@ -0,0 +1,461 @@
+from array import array
+from collections.abc import MutableMapping
+
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT  # 32x32 tiles per chunk
+CHUNK_MASK = CHUNK_SIZE - 1
+
+EMPTY_TILE = 0xFFFFFFFF  # Never produced by TileManager.pack_tile (only the 24 low bits are used)
+_EMPTY_CHUNK = array('I', [EMPTY_TILE]) * (CHUNK_SIZE * CHUNK_SIZE)
+
+OFFGRID_BUCKET_SIZE = 256  # pixels
+
+# Collision shape codes, combined as bit flags when several layers share a cell
+COLLISION_EMPTY = 0
+COLLISION_SOLID = 1  # Full block
+COLLISION_ONE_WAY = 2  # Passable from below (vines...)
+COLLISION_HALF_BOTTOM = 4
+COLLISION_HALF_TOP = 8
+# 45° slopes, named after the corner of the cell that is solid (SLOPE_BR: a floor going up to the right)
+COLLISION_SLOPE_BR = 16
+COLLISION_SLOPE_BL = 32
+COLLISION_SLOPE_TR = 64
+COLLISION_SLOPE_TL = 128
+PARTIAL_SHAPES = (COLLISION_HALF_BOTTOM, COLLISION_HALF_TOP, COLLISION_SLOPE_BR, COLLISION_SLOPE_BL,
+                  COLLISION_SLOPE_TR, COLLISION_SLOPE_TL)  # Resolved against their own rects, see shape_boxes
+COLLISION_PARTIAL = sum(PARTIAL_SHAPES)
+
+# Where a shape goes when its tile is turned a quarter clockwise / flipped. The two halves have no left or right
+# version: a half block on its side counts as a full block
+_ROTATED_SHAPES = {COLLISION_HALF_BOTTOM: COLLISION_SOLID, COLLISION_HALF_TOP: COLLISION_SOLID,
+                   COLLISION_SLOPE_BR: COLLISION_SLOPE_BL, COLLISION_SLOPE_BL: COLLISION_SLOPE_TL,
+                   COLLISION_SLOPE_TL: COLLISION_SLOPE_TR, COLLISION_SLOPE_TR: COLLISION_SLOPE_BR}
+_FLIPPED_H_SHAPES = {COLLISION_SLOPE_BR: COLLISION_SLOPE_BL, COLLISION_SLOPE_BL: COLLISION_SLOPE_BR,
+                     COLLISION_SLOPE_TR: COLLISION_SLOPE_TL, COLLISION_SLOPE_TL: COLLISION_SLOPE_TR}
+_FLIPPED_V_SHAPES = {COLLISION_HALF_BOTTOM: COLLISION_HALF_TOP, COLLISION_HALF_TOP: COLLISION_HALF_BOTTOM,
+                     COLLISION_SLOPE_BR: COLLISION_SLOPE_TR, COLLISION_SLOPE_TR: COLLISION_SLOPE_BR,
+                     COLLISION_SLOPE_BL: COLLISION_SLOPE_TL, COLLISION_SLOPE_TL: COLLISION_SLOPE_BL}
+SLOPE_STEPS = 4  # A slope collides as a staircase of that many steps, low enough for the ledge snapping to climb
+
+
+def transform_shape(code, rotation, flip_h, flip_v):
+    """Shape code of a tile drawn with TileManager.get_transformed_img's rotation (quarters, clockwise) and flips"""
+    if rotation & 1:
+        code = _ROTATED_SHAPES.get(code, code)
+    if rotation & 2:  # Half a turn is both flips
+        flip_h, flip_v = not flip_h, not flip_v
+    if flip_h:
+        code = _FLIPPED_H_SHAPES.get(code, code)
+    if flip_v:
+        code = _FLIPPED_V_SHAPES.get(code, code)
+    return code
+
+
+def shape_boxes(code, tile_size):
+    """(x, y, w, h) boxes, in pixels relative to the cell, a partial shape code collides as"""
+    if code == COLLISION_HALF_BOTTOM:
+        return [(0, tile_size // 2, tile_size, tile_size - tile_size // 2)]
+    if code == COLLISION_HALF_TOP:
+        return [(0, 0, tile_size, tile_size // 2)]
+    step = tile_size // SLOPE_STEPS
+    boxes = []
+    for i in range(SLOPE_STEPS):
+        # Row i from the top, wider and wider towards the solid corner
+        width = step * (i + 1) if code in (COLLISION_SLOPE_BR, COLLISION_SLOPE_BL) else tile_size - step * i
+        x = tile_size - width if code in (COLLISION_SLOPE_BR, COLLISION_SLOPE_TR) else 0
+        boxes.append((x, step * i, width, step))
+    return boxes
+
+
+def parse_loc(loc):
+    """'x;y' -> (x, y) as ints. Raises ValueError if the key isn't a grid location."""
+    x, y = loc.split(";")
+    return int(x), int(y)
+
+
+def loc_key(x, y):
+    return f"{x};{y}"
+
+
+class TileChunk:
+    __slots__ = ["tiles", "count", "version"]
+
+    def __init__(self, tiles=None):
+        self.tiles = array('I', _EMPTY_CHUNK if tiles is None else tiles)
+        self.count = 0
+        self.version = 0  # Bumped on every edit, caches built from the chunk compare it to know they are stale
+
+    def copy(self):
+        chunk = TileChunk(self.tiles)
+        chunk.count = self.count
+        return chunk
+
+
+class ChunkedLayer(MutableMapping):
+    """
+    Grid layer stored as CHUNK_SIZE x CHUNK_SIZE chunks of packed uint32 tiles (TileManager.pack_tile layout),
+    indexed by integer chunk coordinates.
+    Hot paths use the integer API (get_tile, set_tile, iter_region). The mapping interface still speaks the
+    old {"x;y": packed} format so the editor, undo snapshots and map saving keep working unchanged.
+    """
+
+    on_edit = None  # Called with (x, y) after a cell changes
+
+    def __init__(self, tiles=None):
+        self.chunks = {}
+        self.count = 0
+        if tiles:
+            self.update(tiles)
+
+    # --- Integer API ---
+
+    def get_tile(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return None
+        value = chunk.tiles[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+        return None if value == EMPTY_TILE else value
+
+    def set_tile(self, x, y, value):
+        chunk_pos = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(chunk_pos)
+        if chunk is None:
+            chunk = self.chunks[chunk_pos] = TileChunk()
+        index = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        old_value = chunk.tiles[index]
+        if old_value == value:
+            return
+        if old_value == EMPTY_TILE:
+            chunk.count += 1
+            self.count += 1
+        chunk.tiles[index] = value
+        chunk.version += 1
+        if self.on_edit is not None:
+            self.on_edit(x, y)
+
+    def remove_tile(self, x, y):
+        """Removes the tile at (x, y) and returns it, None if the cell was already empty."""
+        chunk_pos = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(chunk_pos)
+        if chunk is None:
+            return None
+        index = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        value = chunk.tiles[index]
+        if value == EMPTY_TILE:
+            return None
+        chunk.tiles[index] = EMPTY_TILE
+        chunk.count -= 1
+        chunk.version += 1
+        self.count -= 1
+        if not chunk.count:
+            del self.chunks[chunk_pos]
+        if self.on_edit is not None:
+            self.on_edit(x, y)
+        return value
+
+    def iter_chunk(self, chunk_pos):
+        """Yields (x, y, tile) for every tile of the chunk at chunk_pos."""
+        chunk = self.chunks.get(chunk_pos)
+        if chunk is None:
+            return
+        base_x, base_y = chunk_pos[0] << CHUNK_SHIFT, chunk_pos[1] << CHUNK_SHIFT
+        tiles = chunk.tiles
+        for index in range(CHUNK_SIZE * CHUNK_SIZE):
+            value = tiles[index]
+            if value != EMPTY_TILE:
+                yield base_x + (index & CHUNK_MASK), base_y + (index >> CHUNK_SHIFT), value
+
+    def iter_region(self, x_min, y_min, x_max, y_max):
+        """Yields (x, y, tile) for every tile with x_min <= x <= x_max and y_min <= y <= y_max, chunk by chunk."""
+        for cx in range(x_min >> CHUNK_SHIFT, (x_max >> CHUNK_SHIFT) + 1):
+            for cy in range(y_min >> CHUNK_SHIFT, (y_max >> CHUNK_SHIFT) + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                tiles = chunk.tiles
+                base_x, base_y = cx << CHUNK_SHIFT, cy << CHUNK_SHIFT
+                lx_min, lx_max = max(x_min - base_x, 0), min(x_max - base_x, CHUNK_MASK)
+                ly_min, ly_max = max(y_min - base_y, 0), min(y_max - base_y, CHUNK_MASK)
+                for ly in range(ly_min, ly_max + 1):
+                    row = ly << CHUNK_SHIFT
+                    for lx in range(lx_min, lx_max + 1):
+                        value = tiles[row | lx]
+                        if value != EMPTY_TILE:
+                            yield base_x + lx, base_y + ly, value
+
+    def items_xy(self):
+        for chunk_pos in list(self.chunks):
+            yield from self.iter_chunk(chunk_pos)
+
+    # --- Mapping API ("x;y" keys) ---
+
+    def __getitem__(self, loc):
+        try:
+            value = self.get_tile(*parse_loc(loc))
+        except (ValueError, AttributeError):
+            value = None
+        if value is None:
+            raise KeyError(loc)
+        return value
+
+    def __setitem__(self, loc, value):
+        self.set_tile(*parse_loc(loc), value)
+
+    def __delitem__(self, loc):
+        try:
+            value = self.remove_tile(*parse_loc(loc))
+        except (ValueError, AttributeError):
+            value = None
+        if value is None:
+            raise KeyError(loc)
+
+    def __contains__(self, loc):
+        try:
+            return self.get_tile(*parse_loc(loc)) is not None
+        except (ValueError, AttributeError):
+            return False
+
+    def __iter__(self):
+        for x, y, _ in self.items_xy():
+            yield loc_key(x, y)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return f"ChunkedLayer({len(self)} tiles, {len(self.chunks)} chunks)"
+
+    def copy(self):
+        layer = ChunkedLayer()
+        layer.chunks = {chunk_pos: chunk.copy() for chunk_pos, chunk in self.chunks.items()}
+        layer.count = self.count
+        return layer
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def to_dict(self):
+        return {loc_key(x, y): value for x, y, value in self.items_xy()}
+
+
+class OffgridLayer(MutableMapping):
+    """
+    Off-grid tiles keep their "x;y" pixel keys, but are also bucketed by position so render only visits the
+    buckets under the camera. Iteration keeps insertion order, like the dict it replaces (it is the draw order).
+    """
+
+    def __init__(self, tiles=None):
+        self.tiles = {}
+        self.positions = {}
+        self.order = {}
+        self.buckets = {}
+        self.next_order = 0
+        if tiles:
+            self.update(tiles)
+
+    @staticmethod
+    def bucket_of(x, y):
+        return int(x // OFFGRID_BUCKET_SIZE), int(y // OFFGRID_BUCKET_SIZE)
+
+    def iter_region(self, x_min, y_min, x_max, y_max):
+        """Yields (loc, x, y, tile) for tiles whose pixel position is inside the given box, in draw order."""
+        found = []
+        bx_min, by_min = self.bucket_of(x_min, y_min)
+        bx_max, by_max = self.bucket_of(x_max, y_max)
+        for bx in range(bx_min, bx_max + 1):
+            for by in range(by_min, by_max + 1):
+                bucket = self.buckets.get((bx, by))
+                if bucket:
+                    for loc in bucket:
+                        x, y = self.positions[loc]
+                        if x_min <= x <= x_max and y_min <= y <= y_max:
+                            found.append(loc)
+        found.sort(key=self.order.__getitem__)
+        for loc in found:
+            x, y = self.positions[loc]
+            yield loc, x, y, self.tiles[loc]
+
+    def __getitem__(self, loc):
+        return self.tiles[loc]
+
+    def __setitem__(self, loc, value):
+        if loc not in self.tiles:
+            x, y = [float(val) for val in loc.split(";")]
+            self.positions[loc] = (x, y)
+            self.order[loc] = self.next_order
+            self.next_order += 1
+            self.buckets.setdefault(self.bucket_of(x, y), set()).add(loc)
+        self.tiles[loc] = value
+
+    def __delitem__(self, loc):
+        del self.tiles[loc]
+        bucket_pos = self.bucket_of(*self.positions.pop(loc))
+        del self.order[loc]
+        bucket = self.buckets[bucket_pos]
+        bucket.discard(loc)
+        if not bucket:
+            del self.buckets[bucket_pos]
+
+    def __contains__(self, loc):
+        return loc in self.tiles
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __repr__(self):
+        return f"OffgridLayer({len(self)} tiles)"
+
+    def copy(self):
+        return OffgridLayer(self.tiles)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def to_dict(self):
+        return dict(self.tiles)
+
+
+class CollisionGrid:
+    """Collision code of every grid cell, in CHUNK_SIZE x CHUNK_SIZE chunks of bytes. Empty cells cost nothing."""
+
+    def __init__(self):
+        self.chunks = {}
+        self.versions = {}  # chunk pos -> stamp of its last change, for caches built from a region of the grid
+        self.stamp = 0
+        self.cleared_stamp = 0
+        self.merged_rects = {}  # chunk pos -> solid_rects, dropped when the chunk changes
+
+    def clear(self):
+        self.chunks = {}
+        self.versions = {}
+        self.merged_rects = {}
+        self.stamp += 1
+        self.cleared_stamp = self.stamp
+
+    def chunk_version(self, chunk_pos):
+        return self.versions.get(chunk_pos, self.cleared_stamp)
+
+    def get(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return COLLISION_EMPTY
+        return chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def set(self, x, y, code):
+        chunk_pos = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(chunk_pos)
+        if chunk is None:
+            if code == COLLISION_EMPTY:
+                return
+            chunk = self.chunks[chunk_pos] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        index = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if chunk[index] == code:
+            return
+        chunk[index] = code
+        self.stamp += 1
+        self.versions[chunk_pos] = self.stamp
+        self.merged_rects.pop(chunk_pos, None)
+        if code == COLLISION_EMPTY and not any(chunk):
+            del self.chunks[chunk_pos]
+
+    def solid_rects(self, chunk_pos):
+        """
+        The solid cells of a chunk merged into a few rectangles (greedy meshing: runs along a row, grown down while
+        the rows below match), as (x, y, w, h) in cells, relative to the chunk.
+        """
+        rects = self.merged_rects.get(chunk_pos)
+        if rects is None:
+            chunk = self.chunks.get(chunk_pos)
+            rects = self.merged_rects[chunk_pos] = merge_solid_cells(chunk) if chunk is not None else []
+        return rects
+
+
+def merge_solid_cells(chunk):
+    used = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+    rects = []
+    for y in range(CHUNK_SIZE):
+        row = y << CHUNK_SHIFT
+        x = 0
+        while x < CHUNK_SIZE:
+            index = row | x
+            if used[index] or not chunk[index] & COLLISION_SOLID:
+                x += 1
+                continue
+            width = 1
+            while (x + width < CHUNK_SIZE and not used[index + width] and
+                   chunk[index + width] & COLLISION_SOLID):
+                width += 1
+            height = 1
+            while y + height < CHUNK_SIZE:
+                start = ((y + height) << CHUNK_SHIFT) | x
+                if any(used[i] or not chunk[i] & COLLISION_SOLID for i in range(start, start + width)):
+                    break
+                height += 1
+            for line in range(y, y + height):
+                start = (line << CHUNK_SHIFT) | x
+                used[start:start + width] = b"\x01" * width
+            rects.append((x, y, width, height))
+            x += width
+    return rects
+
+
+class _Layers(dict):
+    """layer name -> layer storage. Plain dicts put in it (editor, undo snapshots, map files) are converted."""
+    layer_class = None
+    on_edit = None  # Passed down to the layers. Called with (None, None) when a whole layer is replaced
+
+    def __init__(self, layers=None):
+        super().__init__()
+        if layers:
+            self.update(layers)
+
+    def __setitem__(self, layer, tiles):
+        if not isinstance(tiles, self.layer_class):
+            tiles = self.layer_class(tiles)
+        tiles.on_edit = self.on_edit
+        super().__setitem__(layer, tiles)
+        if self.on_edit is not None:
+            self.on_edit(None, None)
+
+    def __delitem__(self, layer):
+        super().__delitem__(layer)
+        if self.on_edit is not None:
+            self.on_edit(None, None)
+
+    def update(self, layers=(), **kwargs):
+        for layer, tiles in dict(layers, **kwargs).items():
+            self[layer] = tiles
+
+    def setdefault(self, layer, tiles=None):
+        if layer not in self:
+            self[layer] = tiles
+        return self[layer]
+
+    def copy(self):
+        return type(self)({layer: tiles.copy() for layer, tiles in self.items()})
+
+    def __copy__(self):
+        return type(self)(self)
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def to_dict(self):
+        return {layer: tiles.to_dict() for layer, tiles in self.items()}
+
+
+class TileLayers(_Layers):
+    layer_class = ChunkedLayer
+
+
+class OffgridLayers(_Layers):
+    layer_class = OffgridLayer
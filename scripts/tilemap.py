@@ -6,20 +6,18 @@ import pygame
 import json
 import math
 import copy
+from collections import OrderedDict
 
 from pygame import BLEND_ADD, BLEND_MAX, BLEND_RGBA_MULT, BLEND_RGBA_SUB, BLEND_RGBA_ADD
 
 from scripts.utils import round_up, Animation
 from scripts.tile import Tile, TileManager
 from scripts.tile import Tile
+from scripts.tile_chunks import (TileLayers, OffgridLayers, CollisionGrid, CHUNK_SIZE,
+                                  CHUNK_SHIFT, COLLISION_EMPTY, COLLISION_SOLID, COLLISION_ONE_WAY, COLLISION_PARTIAL,
+                                  PARTIAL_SHAPES, shape_boxes, loc_key)
 from scripts.pickup import pickups_render_and_update
 
-PHYSICS_TILES = {'whiter_blocks', 'white_blocks', 'purpur_rock', 'vine','mossy_stone',
-                 'gray_mossy_stone', 'mossy_stone_gluy'}
-
-PASSABLE_TILES = {'vine_transp':[0, 1, 2], 'vine_transp_back':[0, 1, 2], 'dark_vine':[0, 1, 2],
-                  'hanging_vine':[0, 1, 2]}
-
 AUTOTILE_TYPES = {'whiter_blocks', 'red_spikes', 'white_blocks', 'spikes', 'purpur_spikes', 'gluy_spikes',
                   'purpur_rock', 'grass', 'stone', 'mossy_stone', 'blue_grass', 'spike_roots', 'gray_mossy_stone',
                   'hollow_stone', 'mossy_stone_gluy', 'dark_hollow_stone', 'purpur_stone'}
@@ -28,6 +26,77 @@ AUTOTILE_COMPATIBILITY = {'purpur_spikes':["spikes"], "spikes":["purpur_spikes"]
                           'mossy_stone': ["mossy_stone_gluy"], 'mossy_stone_gluy': ["mossy_stone"]}
 
 
+class ChunkSurfaceCache:
+    """
+    Grid layers baked into one off-screen surface per chunk, so a frame costs a few chunk blits per layer.
+    A baked chunk is rebuilt only when its version changes (editor edits, tiles extracted into groups...),
+    and the least recently drawn chunks are dropped past max_chunks.
+    """
+    MAX_CHUNKS = 48  # 512x512 RGBA chunks -> about 1 MB each
+
+    def __init__(self, tilemap, max_chunks=MAX_CHUNKS):
+        self.tilemap = tilemap
+        self.max_chunks = max_chunks
+        self.surfaces = OrderedDict()  # (layer, chunk_pos, mask) -> (chunk, version, surface, oversized tiles)
+
+    def clear(self):
+        self.surfaces.clear()
+
+    def get(self, layer, tiles, chunk_pos, mask_instance=None):
+        chunk = tiles.chunks.get(chunk_pos)
+        if chunk is None:
+            return None
+        key = (layer, chunk_pos, mask_instance)
+        baked = self.surfaces.get(key)
+        if baked is None or baked[0] is not chunk or baked[1] != chunk.version:
+            baked = (chunk, chunk.version) + self.bake(tiles, chunk_pos, mask_instance)
+            self.surfaces[key] = baked
+            if len(self.surfaces) > self.max_chunks:
+                self.surfaces.popitem(last=False)
+        self.surfaces.move_to_end(key)
+        return baked[2], baked[3]
+
+    def bake(self, tiles, chunk_pos, mask_instance):
+        tile_size = self.tilemap.tile_size
+        surf = pygame.Surface((CHUNK_SIZE * tile_size, CHUNK_SIZE * tile_size), pygame.SRCALPHA)
+        base_x, base_y = chunk_pos[0] << CHUNK_SHIFT, chunk_pos[1] << CHUNK_SHIFT
+        oversized = []
+        for x, y, packed_tile in tiles.iter_chunk(chunk_pos):
+            img = self.tilemap.get_render_img(packed_tile, None, mask_instance)
+            # Images bigger than a cell would be cut at the chunk border, they are drawn on their own
+            if img.get_width() > tile_size or img.get_height() > tile_size:
+                oversized.append((x, y, img))
+            else:
+                surf.blit(img, ((x - base_x) * tile_size, (y - base_y) * tile_size))
+        return surf, oversized
+
+
+class CellColliderCache:
+    """
+    The physics_candidates tuples of the collision grid cells, one dict per chunk.
+    A chunk's tuples are dropped when its version changes, and the least recently queried chunks past max_chunks.
+    """
+    MAX_CHUNKS = 32  # At most CHUNK_SIZE * CHUNK_SIZE tuples each, entities only query around themselves
+
+    def __init__(self, grid, max_chunks=MAX_CHUNKS):
+        self.grid = grid
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()  # chunk pos -> (version, {(x, y): physics_candidates tuple})
+
+    def clear(self):
+        self.chunks.clear()
+
+    def cells(self, chunk_pos):
+        version = self.grid.chunk_version(chunk_pos)
+        cached = self.chunks.get(chunk_pos)
+        if cached is None or cached[0] != version:
+            cached = self.chunks[chunk_pos] = (version, {})
+            if len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False)
+        self.chunks.move_to_end(chunk_pos)
+        return cached[1]
+
+
 class Tilemap:
 
     BASE_TILEMAP = {"0":{},
@@ -38,6 +107,12 @@ class Tilemap:
         self.game = game
         self.tile_manager = TileManager()
         self.tile_size = tile_size
+        self.collision_grid = CollisionGrid()
+        self.collision_codes = {}  # packed tile -> collision code
+        self.partial_boxes = {}  # collision code -> boxes of its partial shapes, see shape_rects
+        self.cell_colliders = CellColliderCache(self.collision_grid)
+        self.collision_version = 0  # Bumped whenever the grid changes, entity broadphase caches compare it
+        self.neighbor_offsets = {}
         self.tilemap = self.BASE_TILEMAP
         self.offgrid_tiles = {}
         self.links = {}
@@ -46,6 +121,28 @@ class Tilemap:
         self.camera_zones = []
         self.show_collisions = False
         self.render_filters = {}
+        self.chunk_cache = ChunkSurfaceCache(self)
+
+    @property
+    def tilemap(self):
+        return self._tilemap
+
+    @tilemap.setter
+    def tilemap(self, layers):
+        # Maps are kept in chunked storage, whatever was assigned (map file, editor snapshot...)
+        self._tilemap = TileLayers(layers)
+        self._tilemap.on_edit = self.update_collision
+        for tiles in self._tilemap.values():
+            tiles.on_edit = self.update_collision
+        self.rebuild_collision_grid()
+
+    @property
+    def offgrid_tiles(self):
+        return self._offgrid_tiles
+
+    @offgrid_tiles.setter
+    def offgrid_tiles(self, layers):
+        self._offgrid_tiles = OffgridLayers(layers)
 
     def extract(self, tile_loc, layer, keep=False):
         if layer in self.tilemap:
@@ -79,44 +176,102 @@ class Tilemap:
             if tile_loc in self.offgrid_tiles[layer]:
                 return "offgrid"
 
+    def collision_code(self, tile):
+        code = self.collision_codes.get(tile)
+        if code is None:
+            code = self.collision_codes[tile] = self.tile_manager.get_shape(tile)
+        return code
+
+    def shape_rects(self, x, y, code):
+        """Rects the partial shapes (half blocks, slopes) of cell x, y collide as. None of them inside a full block"""
+        if code & COLLISION_SOLID:
+            return []
+        boxes = self.partial_boxes.get(code)
+        if boxes is None:
+            boxes = self.partial_boxes[code] = [box for bit in PARTIAL_SHAPES if code & bit
+                                                for box in shape_boxes(bit, self.tile_size)]
+        ts = self.tile_size
+        return [pygame.Rect(x * ts + bx, y * ts + by, w, h) for bx, by, w, h in boxes]
+
+    def update_collision(self, x, y):
+        """Keeps the collision grid in sync with the layers. (None, None) means a whole layer changed."""
+        if x is None:
+            self.rebuild_collision_grid()
+            return
+        self.collision_version += 1
+        code = COLLISION_EMPTY
+        for layer in self.tilemap.values():
+            tile = layer.get_tile(x, y)
+            if tile is not None:
+                code |= self.collision_code(tile)
+        self.collision_grid.set(x, y, code)
+
+    def rebuild_collision_grid(self):
+        self.collision_version += 1
+        self.collision_codes = {}
+        self.cell_colliders.clear()
+        self.collision_grid.clear()
+        for layer in self.tilemap.values():
+            for x, y, tile in layer.items_xy():
+                code = self.collision_code(tile)
+                if code != COLLISION_EMPTY:
+                    self.collision_grid.set(x, y, self.collision_grid.get(x, y) | code)
+
     def neighbor_offset(self, size, gravity_dir):
+        key = (size[0], size[1], gravity_dir, self.tile_size)
+        if key in self.neighbor_offsets:
+            return self.neighbor_offsets[key]
         offset = []
         tiles_x = round_up(size[0]/self.tile_size) + 1
         tiles_y = round_up(size[1]/self.tile_size) + gravity_dir
         for x in range(-1, tiles_x):
             for y in range(-1, tiles_y):
                 offset.append((x, y))
+        self.neighbor_offsets[key] = offset
         return offset
 
     def between_check(self,p_pos,e_pos):
         y = e_pos[1]
         x_min, x_max = int(min(p_pos[0], e_pos[0])),int(max(p_pos[0], e_pos[0]))
-        for x in range(x_min, x_max+1):
-            if self.solid_check((x,y)):
+        # One lookup per tile column instead of one per pixel, the same shapes as solid_check but one-way tiles
+        # don't block the view
+        tile_y = int(y // self.tile_size)
+        for tile_x in range(x_min // self.tile_size, x_max // self.tile_size + 1):
+            code = self.collision_grid.get(tile_x, tile_y)
+            if code & COLLISION_SOLID:
+                return True
+            if code & COLLISION_PARTIAL:
+                for rect in self.shape_rects(tile_x, tile_y, code):
+                    if rect.top <= y < rect.bottom and max(x_min, rect.left) <= min(x_max, rect.right - 1):
+                        return True
+        for rect in self.game.dynamic_colliders.rects_in(pygame.Rect(x_min, int(y), x_max - x_min + 1, 1), "sinking"):
+            if rect.top < y < rect.bottom and max(x_min, rect.left + 1) <= min(x_max, rect.right - 1):
                 return True
         return False
 
     def tiles_around(self, pos, size, gravity_dir):
         tiles = []
         tile_loc = (int((pos[0]+size[0]/2) // self.tile_size), int((pos[1]+size[1]/2) // self.tile_size))
+        layers = list(self.tilemap.values())
         for offset in self.neighbor_offset(size, gravity_dir):
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
+            check_pos = (tile_loc[0] + offset[0], tile_loc[1] + offset[1])
             if self.show_collisions:
                 pygame.draw.rect(self.game.display, (255, 0, 255),
-                                 ((tile_loc[0] + offset[0]) * self.tile_size - int(self.game.scroll[0]),
-                                  (tile_loc[1] + offset[1]) * self.tile_size - int(self.game.scroll[1]),
+                                 (check_pos[0] * self.tile_size - int(self.game.scroll[0]),
+                                  check_pos[1] * self.tile_size - int(self.game.scroll[1]),
                                   16,
                                   16))
-            for layer in self.tilemap:
-                if check_loc in self.tilemap[layer]:
-                    tiles.append((check_loc, self.tilemap[layer][check_loc]))
+            for layer in layers:
+                tile = layer.get_tile(check_pos[0], check_pos[1])
+                if tile is not None:
+                    tiles.append((check_pos, tile))
         return tiles
 
     def save(self, path):
         f = open(path, 'w')
 
-        json.dump({'tilemap': self.tilemap,
-                        'offgrid': self.offgrid_tiles,
+        json.dump({'tilemap': self.tilemap.to_dict(),
+                        'offgrid': self.offgrid_tiles.to_dict(),
                    'tag_groups': self.tag_groups,
                    'links': self.links,
                    "camera_zones": self.camera_zones,
@@ -141,6 +296,9 @@ class Tilemap:
         f.close()
 
         self.tile_manager.reload_tiles()
+        self.chunk_cache.clear()
+        self.collision_codes = {}
+        self.cell_colliders.clear()
 
         if "tilemap" in map_data:
             #self.convert_on_load(map_data)
@@ -246,17 +404,17 @@ class Tilemap:
         }
 
     def autotile(self, layer):
-        for loc in self.tilemap[layer]:
-            pos = [int(val) for val in loc.split(";")]
-            tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(self.tilemap[layer][loc])
+        tiles = self.tilemap[layer]
+        for x, y, tile in list(tiles.items_xy()):
+            tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(tiles.get_tile(x, y))
             tile_type = self.tile_manager.tiles[tile_id].type
 
             neighbors = set()
             corner_additional_shifts = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
             for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)] + corner_additional_shifts:
-                check_loc = str(pos[0] + shift[0]) + ";" + str(pos[1] + shift[1])
-                if check_loc in self.tilemap[layer]:
-                    check_loc_tile_id = self.tile_manager.unpack_tile(self.tilemap[layer][check_loc])[0]
+                check_tile = tiles.get_tile(x + shift[0], y + shift[1])
+                if check_tile is not None:
+                    check_loc_tile_id = self.tile_manager.unpack_tile(check_tile)[0]
                     check_loc_type  = self.tile_manager.tiles[check_loc_tile_id].type
                     if check_loc_type == tile_type or (tile_type in AUTOTILE_COMPATIBILITY and
                                                                                   check_loc_type in AUTOTILE_COMPATIBILITY[tile_type]):
@@ -275,7 +433,7 @@ class Tilemap:
             if (tile_type in AUTOTILE_TYPES) and (neighbors in a_map):
                 new_variant = a_map[neighbors]
                 if new_variant < len(self.game.assets[tile_type]):
-                    self.tilemap[layer][loc] = self.tile_manager.pack_tile(tile_id, new_variant, rotation, flip_x, flip_y)
+                    tiles.set_tile(x, y, self.tile_manager.pack_tile(tile_id, new_variant, rotation, flip_x, flip_y))
 
     def copy(self, new_game):
         tilemap_copy = Tilemap(new_game, self.tile_size)
@@ -289,64 +447,114 @@ class Tilemap:
         return tilemap_copy
 
     def solid_check(self, pos, transparent_check=True):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ";" + str(int(pos[1] // self.tile_size))
-        for layer in self.tilemap:
-            if tile_loc in self.tilemap[layer]:
-                tile = self.tilemap[layer][tile_loc]
-                tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(tile)
-                tile_type = self.tile_manager.tiles[tile_id].type
-                if tile_type in PHYSICS_TILES:
-                    return self.tilemap[layer][tile_loc]
-                elif transparent_check and tile_type in set(PASSABLE_TILES.keys()) and tile.variant in PASSABLE_TILES[tile_type]:
-                    return self.tilemap[layer][tile_loc]
-
-        for rect in self.game.sinking_rects:
+        code = self.collision_grid.get(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if code & COLLISION_SOLID or (transparent_check and code & COLLISION_ONE_WAY):
+            return True
+        if code & COLLISION_PARTIAL:
+            for rect in self.shape_rects(int(pos[0] // self.tile_size), int(pos[1] // self.tile_size), code):
+                if rect.collidepoint(pos):
+                    return True
+
+        for rect in self.game.dynamic_colliders.rects_in(pygame.Rect(int(pos[0]), int(pos[1]), 1, 1), "sinking"):
             if rect.left < pos[0] < rect.right and rect.top < pos[1] < rect.bottom:
                 return True
             pass
 
-    def transparent_tile_check(self, tile_pos, tile, hitbox: pygame.Rect, gravity_dir):
-        u_rects = []
-        pos, size = hitbox.topleft, hitbox.size
-        tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(tile)
-        tile_type = self.tile_manager.tiles[tile_id].type
-        if tile_type in set(PASSABLE_TILES.keys()) and variant in PASSABLE_TILES[tile_type]:
-            if not self.game.player.collide_with_passable_blocks:  # System in order to make collision with passable blocks more clean (bigger vertical collision offset)
-                if pos[1] + size[1] <= tile_pos[1] * self.tile_size:
-                    self.game.player.collide_with_passable_blocks = True
-            if gravity_dir == 1 and self.game.player.collide_with_passable_blocks:
-                u_rects.append(
-                    pygame.Rect(tile_pos[0] * self.tile_size, tile_pos[1] * self.tile_size, self.tile_size,
-                                self.tile_size))
-        return u_rects
-
-    def physics_rects_around(self, hitbox: pygame.Rect, gravity_dir):
-        pos, size = hitbox.topleft, hitbox.size
+    def transparent_tile_check(self, tile_y, hitbox: pygame.Rect, gravity_dir):
+        """Whether a one-way (passable) tile on row tile_y blocks the hitbox."""
+        if not self.game.player.collide_with_passable_blocks:  # System in order to make collision with passable blocks more clean (bigger vertical collision offset)
+            if hitbox.bottom <= tile_y * self.tile_size:
+                self.game.player.collide_with_passable_blocks = True
+        return gravity_dir == 1 and self.game.player.collide_with_passable_blocks
+
+    def neighbor_bounds(self, hitbox: pygame.Rect, gravity_dir):
+        """Tiles box (inclusive) looked at by physics_rects_around, same cells as neighbor_offset."""
+        tile_x = int((hitbox.x + hitbox.w / 2) // self.tile_size)
+        tile_y = int((hitbox.y + hitbox.h / 2) // self.tile_size)
+        return (tile_x - 1, tile_y - 1,
+                tile_x + round_up(hitbox.w / self.tile_size), tile_y + round_up(hitbox.h / self.tile_size) + gravity_dir - 1)
+
+    def physics_candidates(self, x_min, y_min, x_max, y_max):
+        """
+        (x, y, collision code, rect) for every non empty cell of the box, column by column.
+        The tuples are kept per cell (see CellColliderCache) and shared by every entity: don't change the rects.
+        """
+        candidates = []
+        grid = self.collision_grid
+        chunk_pos = cells = None
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                code = grid.get(x, y)
+                if code:
+                    if chunk_pos != (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT):
+                        chunk_pos = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+                        cells = self.cell_colliders.cells(chunk_pos)
+                    candidate = cells.get((x, y))
+                    if candidate is None:
+                        candidate = cells[(x, y)] = (x, y, code, pygame.Rect(x * self.tile_size, y * self.tile_size,
+                                                                             self.tile_size, self.tile_size))
+                    candidates.append(candidate)
+        return candidates
+
+    def collider_rects(self, candidates, bounds, hitbox: pygame.Rect, gravity_dir, include_solid=True):
+        """
+        Rects of the candidates inside bounds, in physics_rects_around order, plus the dynamic colliders (sinking
+        groups, doors) inside bounds.
+        Without include_solid, only the one-way tiles, sinking groups and doors (solid_rects_in has the rest).
+        """
+        x_min, y_min, x_max, y_max = bounds
+        if self.show_collisions:
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    pygame.draw.rect(self.game.display, (255, 0, 255),
+                                     (x * self.tile_size - int(self.game.scroll[0]),
+                                      y * self.tile_size - int(self.game.scroll[1]),
+                                      16,
+                                      16))
         rects = []
-        for tile_loc, tile in self.tiles_around(pos, size, gravity_dir):
-            tile_pos = [float(val) for val in tile_loc.split(";")]
-            tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(tile)
-            tile_type = self.tile_manager.tiles[tile_id].type
-            if tile_type in PHYSICS_TILES:
-                rects.append(pygame.Rect(tile_pos[0] * self.tile_size, tile_pos[1] * self.tile_size, self.tile_size, self.tile_size))
-            else:
-                rects += self.transparent_tile_check(tile_pos, tile, hitbox, gravity_dir)
+        for x, y, code, rect in candidates:
+            if x_min <= x <= x_max and y_min <= y <= y_max:
+                if code & COLLISION_SOLID and include_solid:
+                    rects.append(rect)
+                if code & COLLISION_ONE_WAY and self.transparent_tile_check(y, hitbox, gravity_dir):
+                    rects.append(rect)
+                if code & COLLISION_PARTIAL:
+                    rects += self.shape_rects(x, y, code)
+
+        ts = self.tile_size
+        rects += self.game.dynamic_colliders.rects_in(pygame.Rect(x_min * ts, y_min * ts, (x_max - x_min + 1) * ts,
+                                                                  (y_max - y_min + 1) * ts))
+        return rects
 
-        rects += self.game.sinking_rects
-        rects += self.game.doors_rects
+    def solid_rects_in(self, x_min, y_min, x_max, y_max):
+        """Merged solid rects (see CollisionGrid.solid_rects) covering the solid cells of the tile box, cut to it"""
+        rects = []
+        ts = self.tile_size
+        for cx in range(x_min >> CHUNK_SHIFT, (x_max >> CHUNK_SHIFT) + 1):
+            for cy in range(y_min >> CHUNK_SHIFT, (y_max >> CHUNK_SHIFT) + 1):
+                base_x, base_y = cx << CHUNK_SHIFT, cy << CHUNK_SHIFT
+                for x, y, w, h in self.collision_grid.solid_rects((cx, cy)):
+                    left, top = max(base_x + x, x_min), max(base_y + y, y_min)
+                    right, bottom = min(base_x + x + w - 1, x_max), min(base_y + y + h - 1, y_max)
+                    if left <= right and top <= bottom:
+                        rects.append(pygame.Rect(left * ts, top * ts, (right - left + 1) * ts, (bottom - top + 1) * ts))
         return rects
 
+    def physics_rects_around(self, hitbox: pygame.Rect, gravity_dir):
+        bounds = self.neighbor_bounds(hitbox, gravity_dir)
+        return self.collider_rects(self.physics_candidates(*bounds), bounds, hitbox, gravity_dir)
+
     def get_type_from_rect(self, rect):
-        for layer in self.tilemap:
-            for tile in self.tilemap[layer]:
-                if str(rect.x//self.tile_size) + ";" + str(rect.y//self.tile_size) == tile:
-                    return self.tilemap[layer][tile].type
+        for layer in self.tilemap.values():
+            tile = layer.get_tile(rect.x//self.tile_size, rect.y//self.tile_size)
+            if tile is not None:
+                return self.tile_manager.tiles[self.tile_manager.unpack_tile(tile)[0]].type
 
     def get_variant_from_rect(self, rect):
-        for layer in self.tilemap:
-            for tile in self.tilemap[layer]:
-                if str(rect.x//self.tile_size) + ";" + str(rect.y//self.tile_size) == tile:
-                    return self.tilemap[layer][tile].variant
+        for layer in self.tilemap.values():
+            tile = layer.get_tile(rect.x//self.tile_size, rect.y//self.tile_size)
+            if tile is not None:
+                return self.tile_manager.unpack_tile(tile)[1]
 
     def pos_visible(self, surf, pos, offset = (0, 0), additional_offset=(0, 0)):
            return (offset[0] - additional_offset[0] <= pos[0] <= offset[0] + additional_offset[0] + surf.get_width() and
@@ -362,69 +570,65 @@ class Tilemap:
 
 
     def render(self, surf, layer, offset = (0, 0), mask_instance=None):
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ";" + str(y)
-                if loc in self.tilemap[layer]:
-                    pos = [int(val) for val in loc.split(";")]
-                    tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(self.tilemap[layer][loc])
-                    tile = self.tile_manager.tiles[tile_id]
-                    images = tile.images.copy()
-                    if isinstance(images, Animation):
-                        img = images.img()
-                    else:
-                        img = images[variant].copy()
-
-                    if loc in self.render_filters:
-                        if list(self.render_filters[loc].keys())[0] == "opacity":
-                            mask = (255, 255, 255, self.render_filters[loc]["opacity"])
-                            img.fill(mask, special_flags=BLEND_RGBA_MULT)
-                        elif list(self.render_filters[loc].keys())[0] == "color":
-                            mask = self.render_filters[loc]["color"]
-                            img = pygame.transform.grayscale(img)
-                            highlight = pygame.Surface(img.get_size(), pygame.SRCALPHA)
-                            highlight.fill(mask)
-
-                            # Blit it onto your image
-                            img.blit(highlight, (0, 0))
-                    elif mask_instance is not None:
-                        img.fill(mask_instance, special_flags=BLEND_RGBA_MULT)
-
-                    img = pygame.transform.rotate(img, rotation * -90)
-                    img = pygame.transform.flip(img, flip_x, flip_y)
-
-                    surf.blit(img, (
-                        pos[0] * self.tile_size - offset[0], pos[1] * self.tile_size - offset[1]))
+        width, height = surf.get_size()
+        x_min, x_max = offset[0] // self.tile_size, (offset[0] + width) // self.tile_size
+        y_min, y_max = offset[1] // self.tile_size, (offset[1] + height) // self.tile_size
+        # Images are drawn from the top left corner of their cell, the biggest ones reach the view from this many
+        # cells up or left of it
+        reach = max(0, -(-self.tile_manager.max_image_size // self.tile_size) - 1)
+        if layer in self.tilemap and self.render_filters:
+            # Filtered tiles (editor selection) change every frame, no point baking them
+            for x, y, packed_tile in self.tilemap[layer].iter_region(x_min - reach, y_min - reach, x_max, y_max):
+                img = self.get_render_img(packed_tile, loc_key(x, y), mask_instance)
+                surf.blit(img, (x * self.tile_size - offset[0], y * self.tile_size - offset[1]))
+
+        elif layer in self.tilemap:
+            tiles = self.tilemap[layer]
+            chunk_pixels = CHUNK_SIZE * self.tile_size
+            for cx in range((x_min - reach) >> CHUNK_SHIFT, (x_max >> CHUNK_SHIFT) + 1):
+                for cy in range((y_min - reach) >> CHUNK_SHIFT, (y_max >> CHUNK_SHIFT) + 1):
+                    baked = self.chunk_cache.get(layer, tiles, (cx, cy), mask_instance)
+                    if baked is None:
+                        continue
+                    chunk_surf, oversized = baked
+                    chunk_x, chunk_y = cx * chunk_pixels - offset[0], cy * chunk_pixels - offset[1]
+                    if (chunk_x < width and chunk_y < height and
+                            chunk_x + chunk_pixels > 0 and chunk_y + chunk_pixels > 0):
+                        surf.blit(chunk_surf, (chunk_x, chunk_y))
+                    for x, y, img in oversized:
+                        # Culled on the image, not on its cell
+                        img_x, img_y = x * self.tile_size - offset[0], y * self.tile_size - offset[1]
+                        if (img_x < width and img_y < height and
+                                img_x + img.get_width() > 0 and img_y + img.get_height() > 0):
+                            surf.blit(img, (img_x, img_y))
 
         if layer in self.offgrid_tiles:
-            for loc in self.offgrid_tiles.copy()[layer]:
-                pos = [float(val) for val in loc.split(";")]
-                tile_id, variant, rotation, flip_x, flip_y = self.tile_manager.unpack_tile(self.offgrid_tiles[layer][loc])
-                tile = self.tile_manager.tiles[tile_id]
-                images = tile.images.copy()
-                if isinstance(images, Animation):
-                    img = images.img()
-                else:
-                    img = images[variant].copy()
-                if loc in self.render_filters:
-                    if list(self.render_filters[loc].keys())[0] == "opacity":
-                        mask = (255, 255, 255, self.render_filters[loc]["opacity"])
-                        img.fill(mask, special_flags=BLEND_RGBA_MULT)
-
-                    elif list(self.render_filters[loc].keys())[0] == "color":
-                        mask = self.render_filters[loc]["color"]
-                        img = pygame.transform.grayscale(img)
-                        highlight = pygame.Surface(img.get_size(), pygame.SRCALPHA)
-                        highlight.fill(mask)
-
-                        # Blit it onto your image
-                        img.blit(highlight, (0, 0))
-                elif mask_instance is not None:
-                    img.fill(mask_instance, special_flags=BLEND_RGBA_MULT)
-
-                img = pygame.transform.rotate(img, rotation * -90)
-                img = pygame.transform.flip(img, flip_x, flip_y)
-
-                surf.blit(img,
-                          (pos[0] - offset[0], pos[1] - offset[1]))
-
+            # Off-grid images are anchored on their top-left corner, so look the biggest image size further up and left
+            margin = self.tile_manager.max_image_size
+            for loc, x, y, packed_tile in self.offgrid_tiles[layer].iter_region(
+                    offset[0] - margin, offset[1] - margin,
+                    offset[0] + surf.get_width(), offset[1] + surf.get_height()):
+                img = self.get_render_img(packed_tile, loc, mask_instance)
+                surf.blit(img, (x - offset[0], y - offset[1]))
+
+    def get_render_img(self, packed_tile, loc, mask_instance=None):
+        img = self.tile_manager.get_transformed_img(packed_tile)
+        if loc not in self.render_filters and mask_instance is None:
+            return img
+
+        img = img.copy()
+        if loc in self.render_filters:
+            if list(self.render_filters[loc].keys())[0] == "opacity":
+                mask = (255, 255, 255, self.render_filters[loc]["opacity"])
+                img.fill(mask, special_flags=BLEND_RGBA_MULT)
+            elif list(self.render_filters[loc].keys())[0] == "color":
+                mask = self.render_filters[loc]["color"]
+                img = pygame.transform.grayscale(img)
+                highlight = pygame.Surface(img.get_size(), pygame.SRCALPHA)
+                highlight.fill(mask)
+
+                # Blit it onto your image
+                img.blit(highlight, (0, 0))
+        elif mask_instance is not None:
+            img.fill(mask_instance, special_flags=BLEND_RGBA_MULT)
+        return img
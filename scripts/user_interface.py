@@ -12,6 +12,9 @@ from scripts.keybind_menu import ControlsMenu
 from scripts.utils import load_images, load_image, Animation, load_editor_tiles, load_animations
 from scripts.text import load_game_font
 
+LIGHTING_RESOLUTIONS = {"FULL": 1, "HALF": 2, "QUARTER": 4}  # Settings choice -> game.lighting_resolution
+LIGHTING_CHOICES = {resolution: choice for choice, resolution in LIGHTING_RESOLUTIONS.items()}
+
 class Menu:
     # --- State Management --- #
     TITLE_STATE = "START_SCREEN"
@@ -197,6 +200,10 @@ class Menu:
                 case "switch":
                     button = ToggleSwitch(self,self.SW * 0.94-button_x ,button_y,width=int(self.SW*0.06),height=int(self.SH/20),font=self.button_font,text=label+":",textx= button_x)
                     button.set_state(bool(value))
+                case "multiple_choices":
+                    button = ArrowSelector(self,self.SW * 0.64,button_y, self.SW * 0.2,self.SH/15,self.button_font,
+                                           self.settings_categories["VIDEO"][label]["choices"],text=label + ":", textx=button_x,text_color2=(255,255,255))
+                    button.set_selected(str(value))
             button_y += self.BUTTON_HEIGHT
             self.video_buttons.append(button)
         self.video_buttons.append(back_btn)
@@ -316,6 +323,8 @@ class Menu:
                 self.settings_categories["VIDEO"][label]["current"] = button.get_normalized()
             elif btn_type == "switch":
                 self.settings_categories["VIDEO"][label]["current"] = button.get_state()
+            elif btn_type == "multiple_choices":
+                self.settings_categories["VIDEO"][label]["current"] = button.get_selected()
 
         # SAVING GAME BUTTONS VALUES
         for label, button in zip(self.game_buttons_labels, self.game_buttons):
@@ -381,6 +390,12 @@ class Menu:
                                              {
                                                  "type": "drag",
                                                  "current": self.game.brightness
+                                             },
+                                        "LIGHTING" :
+                                             {
+                                                 "type": "multiple_choices",
+                                                 "choices": list(LIGHTING_RESOLUTIONS),
+                                                 "current": LIGHTING_CHOICES.get(self.game.lighting_resolution, "FULL")
                                              }
                                         },
 
@@ -767,7 +782,10 @@ class Menu:
                     match button.text:
                         case "FULL SCREEN:":
                             self.game.fullscreen = button.get_state()
-                    check_screen(self.game)
+                        case "LIGHTING:":
+                            self.game.lighting_resolution = LIGHTING_RESOLUTIONS[button.get_selected()]
+                    if not isinstance(button, ArrowSelector):  # The screen mode doesn't change with the lighting
+                        check_screen(self.game)
                     if isinstance(button, MenuButton):
                         self.video_command_nb = 0
                         self.menu_state = self.OPTION_STATE
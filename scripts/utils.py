@@ -177,6 +177,13 @@ def sign(n):
         return 0
     return n/abs(n)
 
+def lerp_pos(prev_pos, pos, alpha, max_step=64):
+    """Rounded position to draw between two simulation steps. Teleports (moves over max_step) aren't smoothed"""
+    if alpha >= 1 or abs(pos[0] - prev_pos[0]) > max_step or abs(pos[1] - prev_pos[1]) > max_step:
+        return [round(pos[0]), round(pos[1])]
+    return [round(prev_pos[0] + (pos[0] - prev_pos[0]) * alpha),
+            round(prev_pos[1] + (pos[1] - prev_pos[1]) * alpha)]
+
 class Animation:
     def __init__(self, images, img_dur = 5, loop = -1):
         self.images = images
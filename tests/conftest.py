@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# No window and no sound, set before pygame initialises. Assets and maps load relative to the repository root
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+MAP_IDS = sorted(int(name[:3]) for name in os.listdir(os.path.join(ROOT, "data", "maps")) if name.endswith(".json"))
+
+
+@pytest.fixture
+def game():
+    from scripts.game import Game
+    return Game(headless=True)
@@ -0,0 +1,50 @@
+import pygame
+
+from scripts.colliders import ColliderRegistry, BUCKET_SIZE
+
+
+class Box:
+    """A collider of one rect"""
+    def __init__(self, x, y, w, h):
+        self.bbox = pygame.Rect(x, y, w, h)
+
+    def rects_in(self, area):
+        return [self.bbox] if self.bbox.colliderect(area) else []
+
+
+def test_queries_only_see_the_colliders_around():
+    registry = ColliderRegistry()
+    door = Box(10, 10, 16, 48)
+    far = Box(10 * BUCKET_SIZE, 0, 16, 16)
+    registry.add(door, "door")
+    registry.add(far, "sinking")
+    assert registry.rects_in(pygame.Rect(0, 0, 32, 32)) == [door.bbox]
+    assert registry.rects_in(pygame.Rect(0, 0, 32, 32), "sinking") == []
+    assert registry.near(pygame.Rect(10 * BUCKET_SIZE, 0, 1, 1), "sinking") == [far]
+    assert registry.is_kind(door.bbox, "door") and not registry.is_kind(door.bbox, "sinking")
+
+
+def test_move_follows_the_bbox_across_buckets():
+    registry = ColliderRegistry()
+    box = Box(0, 0, 16, 16)
+    registry.add(box, "sinking")
+    version = registry.version
+    box.bbox.topleft = (3 * BUCKET_SIZE + 8, -2 * BUCKET_SIZE)
+    registry.move(box)
+    assert registry.version > version
+    assert registry.rects_in(pygame.Rect(0, 0, 16, 16)) == []
+    assert registry.rects_in(pygame.Rect(3 * BUCKET_SIZE, -2 * BUCKET_SIZE, 32, 32)) == [box.bbox]
+    assert set(registry.buckets) == {(3, -2)}  # The old buckets are gone
+
+    registry.remove(box)
+    assert registry.buckets == {} and registry.rects_in(box.bbox) == []
+
+
+def test_answers_come_in_registration_order():
+    registry = ColliderRegistry()
+    boxes = [Box(x, 0, 16, 16) for x in (100, 0, 50)]
+    for box in boxes:
+        registry.add(box, "door")
+    registry.remove(boxes[0])
+    registry.add(boxes[0], "door")  # Back in its first place, like a door closing again
+    assert registry.near(pygame.Rect(0, 0, 200, 16)) == boxes
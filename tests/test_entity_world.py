@@ -0,0 +1,45 @@
+import pygame
+import pytest
+
+from scripts.entity_world import EntityWorld
+from scripts.physics import Entity
+from scripts.tile_chunks import COLLISION_SOLID
+from scripts.tilemap import Tilemap
+
+
+@pytest.fixture
+def floored(game):
+    """An empty tilemap with a floor on row 4, from x = 0 to 320"""
+    tilemap = Tilemap(game, 16)
+    for x in range(20):
+        tilemap.collision_grid.set(x, 4, COLLISION_SOLID)
+    return tilemap
+
+
+def test_bodies_fall_on_the_floor_and_stay_there(game, floored):
+    world = EntityWorld(game)
+    body = world.add(Entity(game, floored, (40, 0), (12, 12)))
+    for _ in range(60):
+        world.step(1)
+    assert body.rect.bottom == 64 and body.velocity[1] == 0 and body.collision["bottom"]
+
+
+def test_fast_bodies_stop_at_the_first_wall(game, floored):
+    floored.collision_grid.set(10, 3, COLLISION_SOLID)
+    world = EntityWorld(game)
+    body = world.add(Entity(game, floored, (16, 52), (12, 12)))
+    body.velocity[0] = 80  # Five tiles per step
+    world.step(1)
+    world.step(1)
+    assert body.rect.right == 160 and body.collision["right"]
+
+
+def test_colliding_finds_the_bodies_by_bucket(game, floored):
+    world = EntityWorld(game)
+    near = world.add(Entity(game, floored, (40, 52), (12, 12)))
+    far = world.add(Entity(game, floored, (280, 52), (12, 12)))
+    world.step(1)
+    assert world.colliding(pygame.Rect(30, 40, 30, 30)) == [near]
+    world.remove(near)
+    assert world.colliding(pygame.Rect(30, 40, 30, 30)) == []
+    assert world.colliding(pygame.Rect(270, 40, 30, 30)) == [far]
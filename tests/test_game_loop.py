@@ -0,0 +1,36 @@
+class ManualClock:
+    """pygame.time.Clock whose time only moves when the test says so"""
+
+    def __init__(self):
+        self.now = 0
+        self.last_tick = 0
+
+    def tick(self, framerate=0):
+        elapsed, self.last_tick = self.now - self.last_tick, self.now
+        return elapsed
+
+
+def frame_ticks(game):
+    ticks = game.ticks
+    game.main_game_logic()
+    return game.ticks - ticks
+
+
+def test_time_spent_out_of_play_is_not_caught_up(game):
+    game.start_headless(1)
+    game.clock = clock = ManualClock()
+    clock.now += 200  # In the pause menu
+    assert frame_ticks(game) > 1  # What the first frame back did, catching up
+    clock.now += 200
+    game.resume_clock()
+    assert frame_ticks(game) == 0
+    clock.now += 1000 / game.SIMULATION_RATE
+    assert frame_ticks(game) == 1
+
+
+def test_a_level_load_starts_the_clock_over(game):
+    game.start_headless(1)
+    game.clock = clock = ManualClock()
+    clock.now += 200
+    game.level_manager.load_level(1)
+    assert frame_ticks(game) == 0
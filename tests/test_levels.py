@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from conftest import MAP_IDS
+
+
+@pytest.mark.parametrize("level_id", MAP_IDS)
+def test_every_level_loads_and_runs(game, level_id):
+    game.start_headless(level_id)
+    game.step({"key_right": 1}, 60)
+    game._render_world()
+    assert not game.player_dead
+
+
+def test_fake_tile_and_sinking_groups_in_the_same_level(game, tmp_path, monkeypatch):
+    with open("data/maps/001.json") as f:
+        map_data = json.load(f)
+    grouped = {loc for group in map_data["tag_groups"].values() for loc, _ in group["tiles"]}
+    fake_locs = [loc for loc in map_data["tilemap"]["0"] if loc not in grouped][:3]
+    map_data["tag_groups"]["9"] = {"tiles": [[loc, "0"] for loc in fake_locs], "tags": {"fake_tile": {}},
+                                   "flags": {"Global": False, "Matched": False}}
+    path = tmp_path / "009.json"
+    path.write_text(json.dumps(map_data))
+
+    def update_map(level_id):
+        game.tilemap.load(str(path))
+        game.tilemap.tile_size = game.tile_size
+    monkeypatch.setattr(game.level_manager, "update_map", update_map)
+    game.level_manager.load_level(1)
+
+    assert [sorted(group.group) for group in game.fake_tiles] == [sorted(fake_locs)]
+    sinking_groups = [group for group in map_data["tag_groups"].values() if "sinking" in group["tags"]]
+    assert len(game.sinking) == len(sinking_groups)
+    assert all(group.mask for group in game.sinking)
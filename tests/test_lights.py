@@ -0,0 +1,52 @@
+import numpy as np
+import pygame
+import pytest
+
+LIGHT_LOCS = ["1;9", "2;9"]  # Tiles of level 1, layer "0"
+
+
+@pytest.fixture
+def lit_game(game, monkeypatch):
+    """Level 1 with a tag group lighting two of its tiles, added back on every map load"""
+    update_map = game.level_manager.update_map
+
+    def update_map_with_lights(level_id):
+        update_map(level_id)
+        game.tilemap.tag_groups["9"] = {"tiles": [[loc, "0"] for loc in LIGHT_LOCS],
+                                        "tags": {"light": {"type": "glowing_mushroom"}},
+                                        "flags": {"Global": False, "Matched": False}}
+    monkeypatch.setattr(game.level_manager, "update_map", update_map_with_lights)
+    game.start_headless(1)
+    return game
+
+
+def tag_lights(game):
+    return sorted((tuple(light["pos"]), light["type"]) for light in game.light_emitting_tiles if light["from_tag"])
+
+
+def test_tagged_tiles_give_lights(lit_game):
+    assert tag_lights(lit_game) == [((24.0, 152.0), "glowing_mushroom"), ((40.0, 152.0), "glowing_mushroom")]
+    assert all(loc in lit_game.tilemap.tilemap["0"] for loc in LIGHT_LOCS)  # The lit tiles stay
+    lit_game.shader.bake_static_lights()
+    assert lit_game.shader.baked_chunks  # Not flickering, baked
+
+
+def test_lights_registered_by_code_stay_through_a_level_load(lit_game):
+    lit_game.shader.register_light_emitting_tile([40, 40], "torch")
+    lit_game.level_manager.load_level(1)
+    assert [light["pos"] for light in lit_game.light_emitting_tiles if not light["from_tag"]] == [[40, 40]]
+    assert len(tag_lights(lit_game)) == 2  # The level's own lights aren't registered twice
+
+
+def test_reduced_lighting_resolution_lights_the_scene_alike(game):
+    game.start_headless(1)
+    scene = pygame.Surface(game.display.get_size())
+    scene.fill((200, 150, 100))
+    lit = {}
+    for resolution in (1, 2, 4):
+        game.lighting_resolution = resolution
+        game.display.blit(scene, (0, 0))
+        game.shader.apply_lighting(game.scroll)
+        lit[resolution] = pygame.surfarray.array3d(game.display).astype(int)
+    assert lit[2].shape == lit[1].shape
+    assert np.abs(lit[2] - lit[1]).mean() < 4 and np.abs(lit[4] - lit[1]).mean() < 8
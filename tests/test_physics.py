@@ -0,0 +1,22 @@
+import pygame
+
+
+class Door:
+    def __init__(self, rect):
+        self.bbox = rect
+
+    def rects_in(self, area):
+        return [self.bbox] if self.bbox.colliderect(area) else []
+
+
+def test_contacts_see_a_door_closing_in_the_same_tick(game):
+    game.start_headless(1)
+    player = game.player
+    player.pos = [52.0, -200.0]  # In the air
+    assert not player.contacts["floor"]
+    rect = player.place(player.contacts_rect)
+    door = Door(pygame.Rect(rect.x, rect.bottom, 16, 16))
+    game.dynamic_colliders.add(door, "door")  # Like doors_update, after the player's physics
+    assert player.contacts["floor"]
+    game.dynamic_colliders.remove(door)
+    assert not player.contacts["floor"]
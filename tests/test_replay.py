@@ -0,0 +1,71 @@
+import pytest
+
+from scripts.game import Game
+from scripts.replay import Replay, pack_inputs, unpack_inputs, REPLAY_KEYS, HEADER
+
+
+def inputs(tick):
+    return {"key_right": int((tick // 90) % 3 != 2), "key_left": int((tick // 90) % 3 == 2),
+            "key_jump": int(tick % 37 < 9), "key_dash": int(tick % 61 == 0), "key_up": int(tick % 122 < 20)}
+
+
+def snapshot(game):
+    return (tuple(game.player.pos), tuple(game.player.velocity), tuple(game.scroll), len(game.particles),
+            tuple(group.y for group in game.sinking), game.sim_time, game.rng.getstate())
+
+
+def test_inputs_pack_into_a_byte():
+    dict_kb = {key: bit % 2 for bit, key in enumerate(REPLAY_KEYS)}
+    mask = pack_inputs(dict_kb)
+    assert mask < 256
+    assert unpack_inputs(mask) == dict_kb
+
+
+def test_record_then_replay_ends_in_the_same_state(game, tmp_path):
+    path = str(tmp_path / "run.anrp")
+    game.start_headless(1)
+    game.player.pos = [52, 20]
+    game.step({"key_right": 1}, 40)  # Recording from the middle of a run
+    game.start_recording(path, seed=1234)
+    recorded = []
+    for tick in range(900):
+        if tick == 300:
+            game.recorder.record_interact()
+            game.interact()
+        game.step(inputs(tick))
+        recorded.append(snapshot(game))
+    game.stop_recording()
+
+    replayed = []
+    replay = Replay.load(path)
+    assert len(replay.ticks) == 900
+    replay.play(Game(headless=True), lambda replay_game, tick: replayed.append(snapshot(replay_game)))
+    assert replayed == recorded
+
+
+def test_f9_records_to_the_replay_path(game, tmp_path):
+    game.start_headless(1)
+    game.replay_path = str(tmp_path / "replays" / "f9.anrp")
+    game.toggle_recording()
+    game.step({"key_right": 1}, 10)
+    game.toggle_recording()
+    assert game.recorder is None
+    assert len(Replay.load(game.replay_path).ticks) == 10
+
+
+def test_frames_drawn_leave_the_simulation_rng_alone(game):
+    game.start_headless(1)
+    state = game.rng.getstate()
+    game.screenshake = 10
+    for _ in range(5):
+        game.shader.create_light_mask(80, (255, 180, 100), 220, 30, flicker=True)
+        game._render_world()
+        game._render_screenshake()
+    assert game.rng.getstate() == state
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "old.anrp"
+    path.write_bytes(HEADER.pack(b"ANRP", 1, 0, 1, 0, 0, 0))
+    with pytest.raises(ValueError):
+        Replay.load(str(path))
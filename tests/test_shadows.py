@@ -0,0 +1,43 @@
+from scripts.tile_chunks import COLLISION_SOLID
+from scripts.tilemap import Tilemap
+
+
+class Lantern:
+    def __init__(self, pos, light_properties):
+        self.pos = pos
+        self.light_properties = light_properties
+
+
+def test_the_caster_follows_the_tilemap_swapped_in(game):
+    caster = game.shader.shadow_caster
+    game.tilemap = Tilemap(game, 16)
+    open_polygon = caster.polygon("lamp", (8, 8), 64)
+    game.tilemap = walled = Tilemap(game, 16)  # Like the editor's play test
+    walled.collision_grid.set(1, 0, COLLISION_SOLID)
+    walled_polygon = caster.polygon("lamp", (8, 8), 64)
+    assert walled_polygon is not open_polygon
+    facing_wall = [x for x, y in walled_polygon if 0 < y < 16]
+    assert facing_wall and max(facing_wall) <= 16 + 1e-6  # The wall cell stops the light
+
+
+def test_object_light_caches_go_with_the_object(game):
+    game.start_headless(1)
+    shader = game.shader
+    lantern = Lantern(list(game.player.pos), dict(game.light_properties["crystal"], shadows=True))
+    shader.register_light_emitting_object(lantern)
+    shader.apply_lighting(game.scroll)
+    assert lantern in shader.shadowed_sprites and lantern in shader.shadow_caster.polygons
+
+    shader.unregister_light_emitting_object(lantern)
+    assert lantern not in game.light_emitting_objects
+    assert lantern not in shader.shadowed_sprites and lantern not in shader.shadow_caster.polygons
+
+
+def test_a_level_load_drops_the_shadow_caches(game):
+    game.start_headless(1)
+    shader = game.shader
+    shader.register_light_emitting_object(Lantern(list(game.player.pos),
+                                                  dict(game.light_properties["crystal"], shadows=True)))
+    shader.apply_lighting(game.scroll)
+    game.level_manager.load_level(1)
+    assert shader.shadowed_sprites == {} and shader.shadow_caster.polygons == {}
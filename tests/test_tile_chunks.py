@@ -0,0 +1,100 @@
+import copy
+import json
+import random
+
+import pytest
+
+from conftest import MAP_IDS
+from scripts.tile_chunks import (ChunkedLayer, OffgridLayer, TileLayers, CollisionGrid, merge_solid_cells, CHUNK_SIZE,
+                                 COLLISION_EMPTY, COLLISION_SOLID, COLLISION_ONE_WAY, COLLISION_HALF_BOTTOM)
+
+
+@pytest.mark.parametrize("map_id", MAP_IDS)
+def test_shipped_layers_round_trip(map_id):
+    with open(f"data/maps/{map_id:03d}.json") as f:
+        map_data = json.load(f)
+    layers = TileLayers(map_data["tilemap"])
+    assert layers.to_dict() == map_data["tilemap"]
+    for name, tiles in map_data["tilemap"].items():
+        assert len(layers[name]) == len(tiles)
+        assert all(layers[name][loc] == value for loc, value in tiles.items())
+
+
+def test_integer_and_mapping_apis_agree_across_chunks():
+    rng = random.Random(7)
+    tiles = {}
+    for _ in range(300):
+        x, y = rng.randint(-3 * CHUNK_SIZE, 3 * CHUNK_SIZE), rng.randint(-3 * CHUNK_SIZE, 3 * CHUNK_SIZE)
+        tiles[f"{x};{y}"] = rng.randint(0, 1 << 20)
+    layer = ChunkedLayer(tiles)
+    assert layer.to_dict() == tiles
+    assert layer.get_tile(-CHUNK_SIZE * 3 - 1, 0) is None and "not;a loc" not in layer
+
+    x_min, y_min, x_max, y_max = -CHUNK_SIZE - 5, -7, CHUNK_SIZE + 3, 2 * CHUNK_SIZE
+    expected = {(x, y, value) for x, y, value in ((*map(int, loc.split(";")), value) for loc, value in tiles.items())
+                if x_min <= x <= x_max and y_min <= y <= y_max}
+    assert set(layer.iter_region(x_min, y_min, x_max, y_max)) == expected
+
+
+def test_removing_the_last_tile_of_a_chunk_drops_it():
+    layer = ChunkedLayer({"-1;-1": 5, "0;0": 6})
+    assert len(layer.chunks) == 2
+    del layer["-1;-1"]
+    assert len(layer.chunks) == 1 and len(layer) == 1
+    assert layer.remove_tile(-1, -1) is None
+    with pytest.raises(KeyError):
+        del layer["-1;-1"]
+
+
+def test_copies_are_independent():
+    layers = TileLayers({"0": {"1;2": 3}})
+    snapshot = copy.deepcopy(layers)
+    layers["0"]["1;2"] = 4
+    layers["0"]["5;5"] = 1
+    assert snapshot.to_dict() == {"0": {"1;2": 3}}
+
+
+def test_offgrid_layer_keeps_the_draw_order():
+    layer = OffgridLayer({"10.5;3": 1, "-400;20": 2, "12;4.25": 3})
+    layer["11;3"] = 4
+    del layer["-400;20"]
+    assert list(layer) == ["10.5;3", "12;4.25", "11;3"]
+    assert [loc for loc, *_ in layer.iter_region(0, 0, 20, 20)] == ["10.5;3", "12;4.25", "11;3"]
+    assert list(layer.iter_region(-500, 0, -300, 40)) == []
+
+
+def covered_cells(rects):
+    cells = [(x + dx, y + dy) for x, y, w, h in rects for dx in range(w) for dy in range(h)]
+    assert len(cells) == len(set(cells))  # No overlap
+    return set(cells)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_merged_rects_cover_exactly_the_solid_cells(seed):
+    rng = random.Random(seed)
+    chunk = bytearray(rng.choice((COLLISION_EMPTY, COLLISION_SOLID, COLLISION_SOLID, COLLISION_ONE_WAY,
+                                  COLLISION_HALF_BOTTOM)) for _ in range(CHUNK_SIZE * CHUNK_SIZE))
+    solid = {(i % CHUNK_SIZE, i // CHUNK_SIZE) for i, code in enumerate(chunk) if code & COLLISION_SOLID}
+    assert covered_cells(merge_solid_cells(chunk)) == solid
+
+
+def test_merged_rects_grow_along_rows_then_down():
+    chunk = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+    for y in range(2, 5):
+        for x in range(1, 4):
+            chunk[y * CHUNK_SIZE + x] = COLLISION_SOLID
+    chunk[5 * CHUNK_SIZE + 1] = COLLISION_SOLID
+    assert merge_solid_cells(chunk) == [(1, 2, 3, 3), (1, 5, 1, 1)]
+    full = bytearray([COLLISION_SOLID]) * (CHUNK_SIZE * CHUNK_SIZE)
+    assert merge_solid_cells(full) == [(0, 0, CHUNK_SIZE, CHUNK_SIZE)]
+
+
+def test_grid_merged_rects_follow_edits():
+    grid = CollisionGrid()
+    grid.set(-1, -1, COLLISION_SOLID)
+    assert grid.solid_rects((-1, -1)) == [(CHUNK_SIZE - 1, CHUNK_SIZE - 1, 1, 1)]
+    grid.set(-2, -1, COLLISION_SOLID)
+    assert grid.solid_rects((-1, -1)) == [(CHUNK_SIZE - 2, CHUNK_SIZE - 1, 2, 1)]
+    grid.set(-2, -1, COLLISION_EMPTY)
+    grid.set(-1, -1, COLLISION_EMPTY)
+    assert grid.solid_rects((-1, -1)) == []
@@ -0,0 +1,62 @@
+import pygame
+import pytest
+
+from scripts.tile_chunks import (CHUNK_SIZE, COLLISION_SOLID, COLLISION_ONE_WAY, COLLISION_HALF_BOTTOM,
+                                 COLLISION_HALF_TOP, COLLISION_SLOPE_BR, COLLISION_SLOPE_TL)
+from scripts.tilemap import Tilemap
+
+
+@pytest.fixture
+def tilemap(game):
+    return Tilemap(game, 16)
+
+
+def test_between_check_sees_through_one_way_tiles(tilemap):
+    tilemap.collision_grid.set(2, 0, COLLISION_ONE_WAY)
+    assert not tilemap.between_check((0, 8), (80, 8))
+    tilemap.collision_grid.set(3, 0, COLLISION_SOLID)
+    assert tilemap.between_check((0, 8), (80, 8))
+
+
+@pytest.mark.parametrize("code", [COLLISION_HALF_BOTTOM, COLLISION_HALF_TOP, COLLISION_SLOPE_BR, COLLISION_SLOPE_TL])
+def test_between_check_follows_the_partial_shapes(tilemap, code):
+    tilemap.collision_grid.set(2, 0, code)
+    for y in range(16):
+        for x_min, x_max in ((0, 80), (0, 36), (40, 80)):
+            blocked = any(tilemap.solid_check((x, y), transparent_check=False) for x in range(x_min, x_max + 1))
+            assert tilemap.between_check((x_min, y), (x_max, y)) == blocked, (y, x_min, x_max)
+
+
+def test_oversized_tiles_are_drawn_from_off_screen_cells(tilemap):
+    manager = tilemap.tile_manager
+    tile_id, tile = next((tile_id, tile) for tile_id, tile in manager.tiles.items()
+                         if isinstance(tile.images, list) and tile.images[0].get_height() > 2 * tilemap.tile_size)
+    packed = manager.pack_tile(tile_id, 0)
+    img = manager.get_transformed_img(packed)
+    tilemap.tilemap["0"] = {"0;0": packed}
+    for offset in ((tilemap.tile_size + 4, 0), (0, img.get_height() - 4)):  # Cell left of the view, cell above it
+        surf = pygame.Surface((64, 64), pygame.SRCALPHA)
+        tilemap.render(surf, "0", offset=offset)
+        expected = pygame.Surface((64, 64), pygame.SRCALPHA)
+        expected.blit(img, (-offset[0], -offset[1]))
+        assert pygame.image.tobytes(surf, "RGBA") == pygame.image.tobytes(expected, "RGBA")
+
+
+def test_physics_candidates_follow_grid_edits(tilemap):
+    tilemap.collision_grid.set(1, 1, COLLISION_SOLID)
+    (candidate,) = tilemap.physics_candidates(0, 0, 2, 2)
+    assert candidate[:3] == (1, 1, COLLISION_SOLID) and tilemap.physics_candidates(0, 0, 2, 2)[0] is candidate
+    tilemap.collision_grid.set(1, 1, COLLISION_ONE_WAY)
+    assert tilemap.physics_candidates(0, 0, 2, 2)[0][2] == COLLISION_ONE_WAY
+    tilemap.collision_grid.set(1, 1, 0)
+    assert tilemap.physics_candidates(0, 0, 2, 2) == []
+
+
+def test_cell_colliders_keep_a_bounded_number_of_chunks(tilemap):
+    cache = tilemap.cell_colliders
+    for chunk_x in range(cache.max_chunks * 2):
+        x = chunk_x * CHUNK_SIZE
+        tilemap.collision_grid.set(x, 0, COLLISION_SOLID)
+        assert len(tilemap.physics_candidates(x, 0, x, 0)) == 1
+    assert len(cache.chunks) == cache.max_chunks
+    assert (cache.max_chunks * 2 - 1, 0) in cache.chunks and (0, 0) not in cache.chunks